@@ -1,21 +1,45 @@
 import copy
+import functools
+import hashlib
 import json
 from typing import Any, Dict, List, Tuple
 from camel.messages import BaseMessage
 from camel.models import ModelFactory
 from camel.types import ModelType, TaskType, ModelPlatformType
 from camel.agents import ChatAgent
-from pdf_toolkit import marker_extractor, mineru_extractor, docling_extractor, combinedTool, cache_to_folder
+from pdf_toolkit.dedup_index import group_fingerprint, image_fingerprint
+from pdf_toolkit.stitch_function import crop_parts, without_position
+from pdf_toolkit.profiling import profile_document, profiling_enabled, write_profile_report
 import os
 import glob
 from PIL import Image
 import pypdfium2 as pdfium
 from PIL import Image
-from my_utils import PDFCropper, get_model_response, save_agent_output
+from model_router import model_name
+from my_utils import PDFCropper, ImagePayload, FusionCheckpoint, get_model_response, StreamingResultWriter
+
+@functools.lru_cache(maxsize=16)
+def _prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def _profile_pdf(method):
+    """
+        开启性能分析时，把该pdf内各阶段的记录归到这个文档名下
+    """
+    @functools.wraps(method)
+    def wrapper(self, test_pdf_path, *args, **kwargs):
+        with profile_document(os.path.basename(test_pdf_path).split(".")[0]):
+            return method(self, test_pdf_path, *args, **kwargs)
+    return wrapper
 
 class TableOptimizationAgent:
-    def __init__(self,model):
+    def __init__(self,model,dedup_index=None):
+        """
+            model: 模型后端，或ModelRouter
+            dedup_index: 可选的FusionDedupIndex，相同的候选表格组在不同文档间复用融合结果
+        """
         self.model_backend = model
+        self.dedup_index = dedup_index
         self.single_tool_prompt = """You are a text correction expert specializing in accurately reproducing text from images.
 You will receive an image and an html representation of the table in the image.
 Your task is to correct any errors in the html representation.  The html representation should be as faithful to the original table image as possible.  The table image may be rotated, but ensure the html representation is not rotated.  Make sure to include HTML for the full table, including the opening and closing table tags.
@@ -110,7 +134,7 @@ Steps you must follow:
 If one candidate is already perfect according to the screenshot and no corrections are needed, you may output it directly.
     """
     
-    def rewrite_table_with_vlm(self, table: Dict[str, Any],table_img: Image.Image):
+    def rewrite_table_with_vlm(self, table: Dict[str, Any],table_img: Image.Image | ImagePayload):
         '''
             对一个表格的一种表示使用VLM进行优化（使用表格截图）
         '''
@@ -129,23 +153,48 @@ If one candidate is already perfect according to the screenshot and no correctio
 
         return content, rewrited_table
         
+    def build_combine_prompt(self, tables: List[Dict[str, Any]], vlm: bool) -> str:
+        '''
+            融合一组候选表格的提示词，combine_tables与FusionScheduler的token估计共用
+            tables: 依次为marker、mineru、docling的结果，不足三个时补None
+        '''
+        tables = [without_position(table) for table in tables] + [None] * (3 - len(tables))
+        template = self.combine_tables_with_vlm_prompt2 if vlm else self.combine_tables_prompt
+        prompt = template.replace("{marker_result}", str(tables[0]))
+        prompt = prompt.replace("{mineru_result}",str(tables[1]))
+        prompt = prompt.replace("{docling_result}",str(tables[2]))
+        return prompt
+
     def combine_tables(self, tables: List[Dict[str, Any]], table_img):
         '''
             对一个表格的多种表示进行融合、优化
-            可选用图片来辅助，若table_img不为None
+            可选用图片来辅助，若table_img不为None（PIL图像或ImagePayload）
         '''
-        for table in tables:
-            if table is not None:
-                table.pop("bbox")
+        tables = [without_position(table) for table in tables]
+
+        # 查找相同候选组的融合结果
+        fingerprint = None
+        if self.dedup_index is not None:
+            # 提示词模板或模型改变后，旧的融合结果不再复用
+            if table_img is None:
+                mode = f"combine:{_prompt_hash(self.combine_tables_prompt)}"
+            else:
+                mode = f"combine_vlm:{_prompt_hash(self.combine_tables_with_vlm_prompt2)}"
+            mode += f":{model_name(self.model_backend)}"
+            image_hash = image_fingerprint(table_img) if table_img is not None else ""
+            fingerprint = group_fingerprint(tables, mode, image_hash)
+            cached = self.dedup_index.get(fingerprint)
+            if cached is not None:
+                content, rewrited_table = cached
+                page_idx = next((t["page_idx"] for t in tables if t is not None), None)
+                if rewrited_table and page_idx is not None:
+                    rewrited_table["page_idx"] = page_idx
+                return content, rewrited_table
+
+        prompt = self.build_combine_prompt(tables, vlm=table_img is not None)
         if table_img is None:
-            prompt = self.combine_tables_prompt.replace("{marker_result}", str(tables[0]))
-            prompt = prompt.replace("{mineru_result}",str(tables[1]))
-            prompt = prompt.replace("{docling_result}",str(tables[2]))
             content = get_model_response(self.model_backend,prompt)
         else:
-            prompt = self.combine_tables_with_vlm_prompt.replace("{marker_result}", str(tables[0]))
-            prompt = prompt.replace("{mineru_result}",str(tables[1]))
-            prompt = prompt.replace("{docling_result}",str(tables[2]))
             content = get_model_response(self.model_backend,prompt,[table_img])
 
         # 从content中提取rewrited_table_body
@@ -162,7 +211,7 @@ If one candidate is already perfect according to the screenshot and no correctio
             answer_part = content.split("final answer:\n", 1)[1].strip()
             # content_part = content.split("final answer:\n", 1)[0]
         else:
-            answer_part = {}
+            answer_part = ""
         
         # Handle potential code blocks (e.g., ```json ... ```)
         import re
@@ -179,31 +228,55 @@ If one candidate is already perfect according to the screenshot and no correctio
             except:
                 pass
 
+        if fingerprint is not None and rewrited_table:
+            self.dedup_index.put(fingerprint, content, rewrited_table)
+
         return content, rewrited_table
 
-    def extract_with_combined_tables(self,test_pdf_path,combined_tools):
+    @_profile_pdf
+    def extract_with_combined_tables(self,test_pdf_path,combined_tools,writer=None,checkpoint_dir=None):
         """
             提取一个pdf文件的表格，通过多种提取工具+LLM修正的方法
+            writer: 可选的StreamingResultWriter，每个表格融合完成后立即写出
+            checkpoint_dir: 可选的状态目录，每个表格完成后记录检查点，重新运行时跳过已完成的表格
         """
         
         # Run the tool extraction
         extracted_tables = combined_tools(test_pdf_path)
+        checkpoint = None
+        if checkpoint_dir is not None:
+            checkpoint = FusionCheckpoint(checkpoint_dir, test_pdf_path, "combined", self.combine_tables_prompt)
         content_list = []
         table_list = []
         # 优化每个表格
-        for tables in extracted_tables:
-            content, rewrited_table = self.combine_tables(tables,None)
+        for i,tables in enumerate(extracted_tables):
+            restored = checkpoint.get(i, tables) if checkpoint is not None else None
+            if restored is not None:
+                content, rewrited_table = restored
+            else:
+                content, rewrited_table = self.combine_tables(tables,None)
+                # 回复无法解析（如被截断）时不记录，续跑时重新融合该表格
+                if checkpoint is not None and rewrited_table:
+                    checkpoint.put(i, tables, None, content, rewrited_table)
             content_list.append(content)
             table_list.append(rewrited_table)
+            if writer is not None:
+                writer.write(i, content, rewrited_table)
         
         return content_list, table_list
 
-    def extract_with_combined_tables_vlm(self,test_pdf_path,combined_tools):
+    @_profile_pdf
+    def extract_with_combined_tables_vlm(self,test_pdf_path,combined_tools,writer=None,checkpoint_dir=None):
         """
             提取一个pdf文件的表格，通过多种提取工具+表格截图辅助的VLM修正的方法
+            writer: 可选的StreamingResultWriter，每个表格融合完成后立即写出
+            checkpoint_dir: 可选的状态目录，每个表格完成后记录检查点，重新运行时跳过已完成的表格
         """
         # Run the tool extraction
         extracted_tables = combined_tools(test_pdf_path)
+        checkpoint = None
+        if checkpoint_dir is not None:
+            checkpoint = FusionCheckpoint(checkpoint_dir, test_pdf_path, "combined_vlm", self.combine_tables_with_vlm_prompt2)
 
         # # 提取表格截图
         cropper = PDFCropper(test_pdf_path)
@@ -212,22 +285,31 @@ If one candidate is already perfect according to the screenshot and no correctio
         table_list = []
         # 优化每个表格
         for i,tables in enumerate(extracted_tables):
-            for table in tables:
-                if table is not None:
-                    rep_table = table
-                    break
-            bbox = rep_table.pop("bbox")
-            page_idx = rep_table["page_idx"]
-            table_img = cropper.crop(int(page_idx),bbox)
-            content, rewrited_table = self.combine_tables(tables,table_img)
+            restored = checkpoint.get(i, tables) if checkpoint is not None else None
+            if restored is not None:
+                content, rewrited_table = restored
+            else:
+                rep_table = next(table for table in tables if table is not None)
+                # 跨页拼接的表格，截图为各页部分的纵向拼接
+                region = crop_parts(rep_table)
+                table_img = cropper.crop_parts_payload(region)
+                content, rewrited_table = self.combine_tables(tables,table_img)
+                # 回复无法解析（如被截断）时不记录，续跑时重新融合该表格
+                if checkpoint is not None and rewrited_table:
+                    crop = {"parts": region, "sha256": table_img.sha256}
+                    checkpoint.put(i, tables, crop, content, rewrited_table)
             content_list.append(content)
             table_list.append(rewrited_table)
+            if writer is not None:
+                writer.write(i, content, rewrited_table)
 
         return content_list, table_list
 
-    def extract_with_single_tool(self,test_pdf_path,output_dir,tool):
+    @_profile_pdf
+    def extract_with_single_tool(self,test_pdf_path,output_dir,tool,writer=None):
         """
             提取一个pdf文件的表格，通过单个提取工具+表格截图辅助的VLM修正的方法
+            writer: 可选的StreamingResultWriter，每个表格修正完成后立即写出
         """
         # Run the tool extraction
         extracted_tables = tool(test_pdf_path)
@@ -239,12 +321,12 @@ If one candidate is already perfect according to the screenshot and no correctio
         table_list = []
         # 优化每个表格
         for i,table in enumerate(extracted_tables):
-            bbox = table.pop("bbox")
-            page_idx = table["page_idx"]
-            table_img = cropper.crop(int(page_idx),bbox)
-            content, rewrited_table = self.rewrite_table_with_vlm(table, table_img)
+            table_img = cropper.crop_payload(int(table["page_idx"]),table["bbox"])
+            content, rewrited_table = self.rewrite_table_with_vlm(without_position(table), table_img)
             content_list.append(content)
             table_list.append(rewrited_table)
+            if writer is not None:
+                writer.write(i, content, rewrited_table)
 
         return content_list, table_list
 
@@ -270,6 +352,7 @@ if __name__ == "__main__":
     ]
 
     # 同时用marker, minerU, docling三种工具进行提取
+    from pdf_toolkit import marker_extractor, mineru_extractor, docling_extractor, combinedTool
     combined_tool = combinedTool(marker_extractor,mineru_extractor,docling_extractor)
 
     for pdf_file in pdf_files:
@@ -277,14 +360,16 @@ if __name__ == "__main__":
         pdf_name = os.path.basename(pdf_file).split(".")[0]
         # extract_with_single_tool(agent, pdf_file, output_folder,mineru_extractor)
         
-        # 使用agent提取表格
-        content_list,table_list =  agent.extract_with_combined_tables(pdf_file,combined_tool)
-        
-        # 保存输出
-        save_agent_output(output_folder,pdf_name,content_list,table_list)
+        # 使用agent提取表格，每个表格完成后立即写入输出
+        with StreamingResultWriter(output_folder,pdf_name) as writer:
+            content_list,table_list =  agent.extract_with_combined_tables(pdf_file,combined_tool,writer=writer)
         
         print(f"Processed {pdf_file}")
 
+    # 设置了环境变量PDF_AGENT_PROFILE时输出性能分析报告
+    if profiling_enabled():
+        print(f"Profile report has been saved to {write_profile_report()}")
+
 
 
 
@@ -0,0 +1,247 @@
+"""
+表格抽取的评估脚本：给定真值表格，计算各工具、match_tables对齐、各融合方法的TEDS与cell-F1，
+同时统计每种融合方法的吞吐(表格/分钟)与每个表格消耗的token，用于在准确率与成本之间选择配置。
+
+真值格式：gt_folder下每个pdf对应一个同名json文件，内容为表格列表
+    [{"page_idx": 0, "table_body": "<table>...</table>"}, ...]
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+from pdf_toolkit import marker_extractor, mineru_extractor, docling_extractor, combinedTool
+from pdf_toolkit.combine_function import match_tables
+from pdf_toolkit.table_metrics import teds, cell_f1
+from my_utils import get_token_usage, reset_token_usage
+
+# 一个预测可以是单个表格，也可以是一组候选（match_tables的输出），候选组取得分最高的成员
+Prediction = Union[Dict[str, Any], Sequence[Optional[Dict[str, Any]]]]
+
+
+def load_ground_truth(gt_folder: str) -> Dict[str, List[Dict[str, Any]]]:
+    ground_truth = {}
+    for gt_file in sorted(glob.glob(os.path.join(gt_folder, "*.json"))):
+        pdf_name = os.path.basename(gt_file).split(".")[0]
+        with open(gt_file, "r", encoding="utf-8") as f:
+            ground_truth[pdf_name] = json.load(f)
+    return ground_truth
+
+
+def _members(pred: Prediction) -> List[Dict[str, Any]]:
+    if isinstance(pred, dict):
+        return [pred]
+    return [tbl for tbl in pred if tbl]
+
+
+def _page(pred: Prediction) -> Optional[int]:
+    """
+    预测表格所在的页，None表示与任意页的真值配对
+    融合结果的page_idx来自LLM输出，可能是"1-2"、"page 3"之类无法解析的值，此时同样返回None
+    """
+    for tbl in _members(pred):
+        if tbl.get("page_idx") not in (None, ""):
+            try:
+                return int(tbl["page_idx"])
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def score_document(pdf_name: str, preds: List[Prediction], gts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    对一个文档打分：同一页内按TEDS贪心配对预测与真值，未配对的真值记0分
+    """
+    candidates = []
+    for p_idx, pred in enumerate(preds):
+        page = _page(pred)
+        for g_idx, gt in enumerate(gts):
+            if page is not None and page != int(gt["page_idx"]):
+                continue
+            scored = [(teds(tbl.get("table_body", ""), gt["table_body"]), tbl) for tbl in _members(pred)]
+            if not scored:
+                continue
+            score, best = max(scored, key=lambda item: item[0])
+            candidates.append((score, p_idx, g_idx, best))
+    candidates.sort(key=lambda item: item[0], reverse=True)
+
+    used_pred, scores = set(), {}
+    for score, p_idx, g_idx, best in candidates:
+        if p_idx in used_pred or g_idx in scores or score <= 0:
+            continue
+        used_pred.add(p_idx)
+        gt_body = gts[g_idx]["table_body"]
+        scores[g_idx] = {
+            "teds": score,
+            "teds_s": teds(best.get("table_body", ""), gt_body, structure_only=True),
+            "cell_f1": cell_f1(best.get("table_body", ""), gt_body)["f1"],
+        }
+
+    per_table = [scores.get(g_idx, {"teds": 0.0, "teds_s": 0.0, "cell_f1": 0.0}) for g_idx in range(len(gts))]
+    return {"pdf_name": pdf_name, "n_pred": len(preds), "n_gt": len(gts),
+            "n_matched": len(scores), "per_table": per_table}
+
+
+def _score_job(job):
+    return score_document(*job)
+
+
+def score_predictions(
+    predictions: Dict[str, List[Prediction]],
+    ground_truth: Dict[str, List[Dict[str, Any]]],
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    并行地对多个文档打分并汇总。workers=1时在当前进程内计算
+    """
+    jobs = [(name, predictions.get(name, []), gts) for name, gts in ground_truth.items()]
+    if workers == 1 or len(jobs) <= 1:
+        doc_scores = [_score_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            doc_scores = list(executor.map(_score_job, jobs, chunksize=chunksize))
+
+    per_table = [s for doc in doc_scores for s in doc["per_table"]]
+    n_gt = sum(doc["n_gt"] for doc in doc_scores)
+    n_pred = sum(doc["n_pred"] for doc in doc_scores)
+    n_matched = sum(doc["n_matched"] for doc in doc_scores)
+
+    def mean(key):
+        return sum(s[key] for s in per_table) / len(per_table) if per_table else 0.0
+
+    return {
+        "teds": mean("teds"),
+        "teds_s": mean("teds_s"),
+        "cell_f1": mean("cell_f1"),
+        "table_recall": n_matched / n_gt if n_gt else 0.0,
+        "table_precision": n_matched / n_pred if n_pred else 0.0,
+        "n_gt": n_gt,
+        "n_pred": n_pred,
+    }
+
+
+def _timed_fusion(run: Callable[[str], Any], pdf_files: Dict[str, str]):
+    """
+    运行一种融合方法，返回预测结果、吞吐与token用量
+    """
+    predictions = {}
+    reset_token_usage()
+    start = time.perf_counter()
+    for pdf_name, pdf_file in pdf_files.items():
+        _, table_list = run(pdf_file)
+        predictions[pdf_name] = [tbl for tbl in table_list if tbl]
+    elapsed = time.perf_counter() - start
+    usage = get_token_usage()
+    n_tables = sum(len(tables) for tables in predictions.values())
+    cost = {
+        "seconds": elapsed,
+        "tables": n_tables,
+        "tables_per_minute": n_tables / elapsed * 60 if elapsed > 0 else 0.0,
+        "llm_calls": usage["calls"],
+        "tokens_per_table": usage["total_tokens"] / n_tables if n_tables else 0.0,
+        "prompt_tokens_per_table": usage["prompt_tokens"] / n_tables if n_tables else 0.0,
+    }
+    return predictions, cost
+
+
+def evaluate(
+    pdf_files: Dict[str, str],
+    ground_truth: Dict[str, List[Dict[str, Any]]],
+    tools: Dict[str, Callable],
+    agent=None,
+    fusion_modes: Sequence[str] = ("combined", "combined_vlm", "single_tool"),
+    iou_thresholds: Sequence[float] = (0.70,),
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    pdf_files: {pdf_name: pdf_path}，pdf_name与真值文件名对应
+    tools: {工具名: 抽取函数}，顺序即combinedTool中的顺序(marker, mineru, docling)
+    agent: TableOptimizationAgent，为None时只评估工具与match_tables
+    返回：{"tools": {...}, "match_tables": {...}, "fusion": {...}}
+    """
+    report: Dict[str, Any] = {"tools": {}, "match_tables": {}, "fusion": {}}
+
+    # 各工具单独的抽取结果
+    tool_outputs: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for tool_name, tool in tools.items():
+        start = time.perf_counter()
+        tool_outputs[tool_name] = {name: tool(path) for name, path in pdf_files.items()}
+        scores = score_predictions(tool_outputs[tool_name], ground_truth, workers)
+        scores["seconds"] = time.perf_counter() - start
+        report["tools"][tool_name] = scores
+
+    # match_tables 在不同iou阈值下的召回
+    for iou_threshold in iou_thresholds:
+        groups = {
+            name: match_tables([copy.deepcopy(tool_outputs[t][name]) for t in tools], iou_threshold)
+            for name in pdf_files
+        }
+        report["match_tables"][str(iou_threshold)] = score_predictions(groups, ground_truth, workers)
+
+    if agent is None:
+        return report
+
+    combined_tool = combinedTool(*tools.values())
+    for mode in fusion_modes:
+        if mode == "combined":
+            runs = {"combined": lambda pdf: agent.extract_with_combined_tables(pdf, combined_tool)}
+        elif mode == "combined_vlm":
+            runs = {"combined_vlm": lambda pdf: agent.extract_with_combined_tables_vlm(pdf, combined_tool)}
+        elif mode == "single_tool":
+            runs = {
+                f"single_tool/{tool_name}": (lambda pdf, tool=tool: agent.extract_with_single_tool(pdf, None, tool))
+                for tool_name, tool in tools.items()
+            }
+        else:
+            raise ValueError(f"unknown fusion mode: {mode}")
+        for run_name, run in runs.items():
+            predictions, cost = _timed_fusion(run, pdf_files)
+            scores = score_predictions(predictions, ground_truth, workers)
+            scores.update(cost)
+            report["fusion"][run_name] = scores
+            print(f"{run_name}: TEDS={scores['teds']:.4f} cell-F1={scores['cell_f1']:.4f} "
+                  f"{scores['tables_per_minute']:.1f} 表格/分钟 {scores['tokens_per_table']:.0f} tokens/表格")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="评估表格抽取与融合的准确率和成本")
+    parser.add_argument("--pdf_folder", required=True)
+    parser.add_argument("--gt_folder", required=True)
+    parser.add_argument("--output", default="./eval_report.json")
+    parser.add_argument("--modes", nargs="*", default=["combined", "combined_vlm", "single_tool"])
+    parser.add_argument("--iou", nargs="*", type=float, default=[0.5, 0.6, 0.7, 0.8])
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    ground_truth = load_ground_truth(args.gt_folder)
+    pdf_files = {
+        name: os.path.join(args.pdf_folder, f"{name}.pdf")
+        for name in ground_truth
+        if os.path.exists(os.path.join(args.pdf_folder, f"{name}.pdf"))
+    }
+    ground_truth = {name: ground_truth[name] for name in pdf_files}
+
+    agent = None
+    if args.modes:
+        from camel.models import ModelFactory
+        from camel.types import ModelType, ModelPlatformType
+        from combine_table_agent import TableOptimizationAgent
+        model = ModelFactory.create(
+            model_platform=ModelPlatformType.DEEPSEEK,
+            model_type=ModelType.DEEPSEEK_CHAT,
+            model_config_dict={"temperature": 0.0},
+        )
+        agent = TableOptimizationAgent(model=model)
+
+    tools = {"marker": marker_extractor, "mineru": mineru_extractor, "docling": docling_extractor}
+    report = evaluate(pdf_files, ground_truth, tools, agent, args.modes, args.iou, args.workers)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    print(f"Evaluation report has been saved to {args.output}")
@@ -0,0 +1,239 @@
+"""
+带截止时间与token预算的融合调度。
+按文档顺序逐组调用combine_tables时，没有办法在时间或token配额不足时取舍。
+FusionScheduler先估计每组候选表格的token开销（提示词+截图+输出），按优先级（候选之间的分歧程度、表格大小）
+依次融合；预计会超出截止时间或token预算的组不再调用LLM，退化为候选之间的共识结果或最可信的单个工具结果，
+并在报告中列出被退化的表格。
+    scheduler = FusionScheduler(agent, deadline=time.time() + 600, token_budget=200_000)
+    content_list, table_list, report = scheduler.extract(pdf_file, combined_tool, vlm=True)
+"""
+import copy
+import math
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from pdf_toolkit.table_grid import normalize_table_html, parse_table_html
+from pdf_toolkit.table_metrics import cell_f1
+from pdf_toolkit.stitch_function import crop_parts
+from my_utils import PDFCropper, get_thread_token_usage
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken是可选依赖，缺失或无法下载词表时按字符数估计
+    _encoding = None
+
+
+def estimate_text_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # 中英文混合时大约每3个字符一个token
+    return len(text) // 3 + 1
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """
+    按OpenAI的高精度图片计费方式估计：缩放到2048以内、短边768后按512x512分块
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def _candidates(tables: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [t for t in tables if t is not None]
+
+
+def disagreement(tables: List[Optional[Dict[str, Any]]]) -> float:
+    """
+    候选之间的分歧程度：1 - 两两cell-F1的均值；只有一个候选时无法交叉验证，记为0.5
+    """
+    candidates = _candidates(tables)
+    if len(candidates) < 2:
+        return 0.5
+    scores = [
+        cell_f1(a.get("table_body", ""), b.get("table_body", ""))["f1"]
+        for i, a in enumerate(candidates) for b in candidates[i + 1:]
+    ]
+    return 1.0 - sum(scores) / len(scores)
+
+
+def _majority_text(values: List[str]) -> str:
+    values = [v for v in values if v and v.strip()]
+    if not values:
+        return ""
+    return Counter(values).most_common(1)[0][0]
+
+
+def consensus_table(tables: List[Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], str]:
+    """
+    不调用LLM的退化结果，返回(表格, 方法)：
+    多数候选规范化后的HTML一致时取该结果("consensus")，否则取与其它候选平均一致度最高的候选("best_single")
+    标题与脚注取候选中出现最多的非空值
+    """
+    candidates = _candidates(tables)
+    if not candidates:
+        return {}, "empty"
+    normalized = [normalize_table_html(t.get("table_body", "")) for t in candidates]
+    body, votes = Counter(normalized).most_common(1)[0]
+    if votes * 2 > len(candidates) and len(candidates) > 1:
+        best, method = candidates[normalized.index(body)], "consensus"
+    else:
+        def agreement(t):
+            others = [o for o in candidates if o is not t]
+            if not others:
+                return 0.0
+            return sum(cell_f1(t.get("table_body", ""), o.get("table_body", ""))["f1"] for o in others) / len(others)
+        best, method = max(candidates, key=agreement), "best_single"
+
+    result = {
+        "table_body": best.get("table_body", ""),
+        "table_caption": _majority_text([t.get("table_caption", "") for t in candidates]),
+        "table_footnote": _majority_text([t.get("table_footnote", "") for t in candidates]),
+        "page_idx": best.get("page_idx"),
+    }
+    return result, method
+
+
+class FusionScheduler:
+    """
+    agent: TableOptimizationAgent
+    deadline: 截止时间（time.time()时间戳），None表示不限
+    token_budget: 本调度器可使用的token总数，None表示不限
+    completion_tokens: 估计输出token时，在候选表格长度之外额外预留的数量（comparison部分）
+    seconds_per_1k_tokens: 还没有实测数据时用于预测耗时的初值，之后按实测值更新
+    safety: 预测值的放大系数
+    预估的token数按实测用量与预估值之比(token_ratio)校正，该比值同样按实测值滑动更新
+    """
+    def __init__(self, agent, deadline: Optional[float] = None, token_budget: Optional[int] = None,
+                 completion_tokens: int = 300, seconds_per_1k_tokens: float = 5.0, safety: float = 1.2):
+        self.agent = agent
+        self.deadline = deadline
+        self.token_budget = token_budget
+        self.completion_tokens = completion_tokens
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.safety = safety
+        self.tokens_used = 0
+        self.token_ratio = 1.0
+        self._ratio_samples = 0
+
+    def estimate_tokens(self, tables: List[Optional[Dict[str, Any]]], image=None) -> int:
+        """
+        估计一组候选融合一次的token数，提示词的拼接方式与combine_tables一致
+        """
+        tokens = estimate_text_tokens(self.agent.build_combine_prompt(tables, vlm=image is not None))
+        if image is not None:
+            tokens += estimate_image_tokens(image.width, image.height)
+        longest_body = max((len(t.get("table_body", "")) for t in _candidates(tables)), default=0)
+        tokens += estimate_text_tokens("x" * longest_body) + self.completion_tokens
+        return tokens
+
+    @staticmethod
+    def priority(tables: List[Optional[Dict[str, Any]]]) -> Tuple[float, int]:
+        """
+        分歧越大、表格越大越优先调用LLM
+        """
+        n_cells = max((len(parse_table_html(t.get("table_body", "") or "")) for t in _candidates(tables)), default=0)
+        return disagreement(tables), n_cells
+
+    def _degrade_reason(self, est_tokens: int) -> Optional[str]:
+        expected_tokens = est_tokens * self.token_ratio
+        if self.token_budget is not None and self.tokens_used + expected_tokens * self.safety > self.token_budget:
+            return "token_budget"
+        if self.deadline is not None:
+            est_seconds = expected_tokens / 1000 * self.seconds_per_1k_tokens * self.safety
+            if time.time() + est_seconds > self.deadline:
+                return "deadline"
+        return None
+
+    def _update_estimates(self, est_tokens: int, used_tokens: int, elapsed: float) -> None:
+        """
+        按一次实际调用更新token校正比例与每千token的耗时；第一次实测直接替换初值
+        """
+        ratio = used_tokens / max(1, est_tokens)
+        self.token_ratio = ratio if self._ratio_samples == 0 else 0.7 * self.token_ratio + 0.3 * ratio
+        self._ratio_samples += 1
+        self.seconds_per_1k_tokens = 0.7 * self.seconds_per_1k_tokens + 0.3 * elapsed / used_tokens * 1000
+
+    def run(self, groups: List[List[Optional[Dict[str, Any]]]], images: Optional[List[Any]] = None, writer=None):
+        """
+        融合多组候选表格，返回(content_list, table_list, report)，结果按输入顺序排列
+        images: 与groups对应的表格截图，None表示纯文本融合
+        writer: 可选的StreamingResultWriter，每个表格融合或退化后立即写出（按完成顺序，记录中带table_idx）
+        """
+        start = time.time()
+        images = images or [None] * len(groups)
+        plans = []
+        for i, (tables, image) in enumerate(zip(groups, images)):
+            diff, n_cells = self.priority(tables)
+            plans.append({"table_idx": i, "est_tokens": self.estimate_tokens(tables, image),
+                          "disagreement": diff, "n_cells": n_cells})
+        order = sorted(plans, key=lambda p: (p["disagreement"], p["n_cells"]), reverse=True)
+
+        content_list: List[str] = [""] * len(groups)
+        table_list: List[Dict[str, Any]] = [{} for _ in groups]
+        degraded = []
+        for plan in order:
+            i = plan["table_idx"]
+            reason = self._degrade_reason(plan["est_tokens"])
+            if reason is None:
+                # 只统计本线程的用量，其它线程的请求不会混入
+                usage_before = get_thread_token_usage()
+                call_start = time.time()
+                try:
+                    content_list[i], table_list[i] = self.agent.combine_tables(copy.deepcopy(groups[i]), images[i])
+                except Exception as e:
+                    # API出错、超时等只影响这一个表格，退化后继续处理其余表格
+                    reason = f"error: {type(e).__name__}: {e}"
+                elapsed = time.time() - call_start
+                usage_after = get_thread_token_usage()
+                # 命中去重索引时没有调用模型，不计入预算，也不参与耗时估计
+                if usage_after["calls"] > usage_before["calls"]:
+                    used = usage_after["total_tokens"] - usage_before["total_tokens"]
+                    if used > 0:
+                        self._update_estimates(plan["est_tokens"], used, elapsed)
+                    else:
+                        # 后端没有返回用量时按校正后的预估值计入
+                        used = int(plan["est_tokens"] * self.token_ratio)
+                    self.tokens_used += used
+                if reason is None:
+                    if table_list[i]:
+                        if writer is not None:
+                            writer.write(i, content_list[i], table_list[i])
+                        continue
+                    reason = "empty_answer"
+            table_list[i], method = consensus_table(groups[i])
+            content_list[i] = f"degraded: {method} ({reason})"
+            degraded.append({**plan, "method": method, "reason": reason})
+            if writer is not None:
+                writer.write(i, content_list[i], table_list[i])
+
+        report = {
+            "tables": len(groups),
+            "fused": len(groups) - len(degraded),
+            "degraded": sorted(degraded, key=lambda d: d["table_idx"]),
+            "tokens_used": self.tokens_used,
+            "estimated_tokens": sum(p["est_tokens"] for p in plans),
+            "token_ratio": self.token_ratio,
+            "seconds": time.time() - start,
+        }
+        if degraded:
+            print(f"共{len(groups)}个表格，{len(degraded)}个因时间、token预算或调用出错退化为共识/单工具结果")
+        return content_list, table_list, report
+
+    def extract(self, test_pdf_path, combined_tools, vlm: bool = False, writer=None):
+        """
+        与agent.extract_with_combined_tables(_vlm)相同的流程，但按预算调度融合
+        writer: 可选的StreamingResultWriter，每个表格完成后立即写出
+        """
+        groups = combined_tools(test_pdf_path)
+        images = None
+        if vlm:
+            cropper = PDFCropper(test_pdf_path)
+            images = []
+            for tables in groups:
+                rep_table = _candidates(tables)[0]
+                images.append(cropper.crop_parts_payload(crop_parts(rep_table)))
+        return self.run(groups, images, writer)
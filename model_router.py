@@ -0,0 +1,242 @@
+"""
+多个模型后端之间的路由。
+ModelRouter与camel的模型后端一样提供run(messages)接口，可直接传给TableOptimizationAgent：
+    router = ModelRouter(text_backends=[deepseek_a, deepseek_b], vision_backends=[vlm])
+    agent = TableOptimizationAgent(model=router)
+- 纯文本请求（combine_tables不带截图）进入text池，带图片的请求进入vision池
+- 按观测到的延迟(EWMA)、错误率、在途请求数选择后端
+- 请求耗时超过该后端延迟的指定分位数时，向另一个后端发出对冲请求，取先返回的结果
+- 后端出错时自动换下一个后端重试，连续出错的后端暂时冷却
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def _has_image(messages: List[Dict[str, Any]]) -> bool:
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, list) and any(
+            isinstance(part, dict) and part.get("type") == "image_url" for part in content
+        ):
+            return True
+    return False
+
+
+def model_name(backend: Any) -> str:
+    """
+    模型后端的标识：camel模型后端与ModelRouter的model_type，没有时退回类名
+    """
+    model_type = getattr(backend, "model_type", None)
+    if model_type is None:
+        return type(backend).__name__
+    return str(getattr(model_type, "value", model_type))
+
+
+class _BackendState:
+    """
+    单个后端的运行统计
+    """
+    __slots__ = ("name", "backend", "latencies", "ewma_latency", "error_rate",
+                 "consecutive_errors", "in_flight", "cooldown_until", "requests", "errors")
+
+    def __init__(self, name: str, backend: Any, window: int):
+        self.name = name
+        self.backend = backend
+        self.latencies: deque = deque(maxlen=window)
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.consecutive_errors = 0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def score(self, fallback_latency: float) -> float:
+        """
+        越小越优先；从未被请求过的后端优先被探测一次。
+        只出过错、还没有延迟样本的后端按fallback_latency（池中最慢的EWMA延迟）估计，并同样按错误率放大
+        """
+        if self.requests == 0 and self.in_flight == 0:
+            return 0.0
+        latency = self.ewma_latency if self.ewma_latency is not None else fallback_latency
+        return latency * (1 + self.in_flight) / max(1e-3, 1.0 - self.error_rate)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ModelRouter:
+    """
+    text_backends / vision_backends: 模型后端列表，或{名称: 后端}字典；vision_backends为空时图片请求也走text池
+    hedge_percentile: 请求耗时超过该分位数的延迟时发出对冲请求，None表示不对冲
+    hedge_min_samples: 后端至少有这么多延迟样本后才启用对冲
+    max_attempts: 单个请求最多尝试的后端次数（含失败重试）
+    cooldown: 连续出错cooldown_errors次的后端在cooldown秒内不再被选择
+    explore: 随机选择后端的概率，使偶尔变慢过的后端有机会恢复
+    """
+    def __init__(
+        self,
+        text_backends,
+        vision_backends=None,
+        hedge_percentile: Optional[float] = 0.95,
+        hedge_min_samples: int = 20,
+        max_attempts: int = 3,
+        cooldown: float = 30.0,
+        cooldown_errors: int = 3,
+        ewma_alpha: float = 0.2,
+        explore: float = 0.05,
+        window: int = 200,
+        max_workers: int = 32,
+    ):
+        self.text_pool = self._make_pool(text_backends, "text", window)
+        self.vision_pool = self._make_pool(vision_backends, "vision", window) if vision_backends else self.text_pool
+        if not self.text_pool:
+            raise ValueError("ModelRouter needs at least one text backend")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_attempts = max_attempts
+        self.cooldown = cooldown
+        self.cooldown_errors = cooldown_errors
+        self.ewma_alpha = ewma_alpha
+        self.explore = explore
+        self.hedged_requests = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model_router")
+
+    @staticmethod
+    def _make_pool(backends, prefix: str, window: int) -> List[_BackendState]:
+        if isinstance(backends, dict):
+            items = list(backends.items())
+        else:
+            items = [(f"{prefix}{i}:{model_name(b)}", b)
+                     for i, b in enumerate(backends or [])]
+        return [_BackendState(str(name), backend, window) for name, backend in items]
+
+    def _pick(self, pool: Sequence[_BackendState], exclude=()) -> Optional[_BackendState]:
+        now = time.monotonic()
+        with self._lock:
+            candidates = [s for s in pool if s not in exclude and s.cooldown_until <= now]
+            if not candidates:
+                # 全部冷却中时，退而选择未尝试过的任意后端
+                candidates = [s for s in pool if s not in exclude]
+            if not candidates:
+                return None
+            if random.random() < self.explore:
+                best = random.choice(candidates)
+            else:
+                worst = max((s.ewma_latency for s in pool if s.ewma_latency is not None), default=1.0)
+                best = min(candidates, key=lambda s: (s.score(worst), random.random()))
+            best.in_flight += 1
+            return best
+
+    def _call(self, state: _BackendState, messages, args, kwargs):
+        start = time.monotonic()
+        try:
+            response = state.backend.run(messages, *args, **kwargs)
+        except Exception:
+            self._record(state, None)
+            raise
+        self._record(state, time.monotonic() - start)
+        return response
+
+    def _record(self, state: _BackendState, latency: Optional[float]):
+        alpha = self.ewma_alpha
+        with self._lock:
+            state.in_flight -= 1
+            state.requests += 1
+            if latency is None:
+                state.errors += 1
+                state.consecutive_errors += 1
+                state.error_rate = alpha + (1 - alpha) * state.error_rate
+                if state.consecutive_errors >= self.cooldown_errors:
+                    state.cooldown_until = time.monotonic() + self.cooldown
+                return
+            state.consecutive_errors = 0
+            state.error_rate = (1 - alpha) * state.error_rate
+            state.latencies.append(latency)
+            state.ewma_latency = latency if state.ewma_latency is None else \
+                alpha * latency + (1 - alpha) * state.ewma_latency
+
+    def _hedge_delay(self, state: _BackendState) -> Optional[float]:
+        if self.hedge_percentile is None or len(state.latencies) < self.hedge_min_samples:
+            return None
+        return state.percentile(self.hedge_percentile)
+
+    def run(self, messages, *args, **kwargs):
+        pool = self.vision_pool if _has_image(messages) else self.text_pool
+        tried: List[_BackendState] = []
+        pending = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            state = self._pick(pool, tried)
+            if state is None:
+                return False
+            tried.append(state)
+            pending[self._executor.submit(self._call, state, messages, args, kwargs)] = state
+            return True
+
+        if not launch():
+            raise RuntimeError("no model backend available")
+        while pending:
+            timeout = None
+            if len(pending) == 1 and len(tried) < self.max_attempts:
+                timeout = self._hedge_delay(next(iter(pending.values())))
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 主请求过慢，向另一个后端发出对冲请求
+                if launch():
+                    with self._lock:
+                        self.hedged_requests += 1
+                    continue
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                try:
+                    # 先返回的结果生效，仍在进行的对冲请求在后台结束后只更新统计
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+            if not pending and len(tried) < self.max_attempts:
+                launch()
+        raise last_error if last_error is not None else RuntimeError("all model backends failed")
+
+    @property
+    def model_type(self) -> str:
+        """
+        各池中后端模型的标识，与camel模型后端的model_type对应，用于区分不同模型配置下缓存的融合结果
+        """
+        def pool_id(pool):
+            return ",".join(sorted(model_name(s.backend) for s in pool))
+        return f"router(text={pool_id(self.text_pool)};vision={pool_id(self.vision_pool)})"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = {"text": self.text_pool}
+            if self.vision_pool is not self.text_pool:
+                pools["vision"] = self.vision_pool
+            return {
+                "hedged_requests": self.hedged_requests,
+                "pools": {
+                    pool_name: [{
+                        "name": s.name,
+                        "requests": s.requests,
+                        "errors": s.errors,
+                        "error_rate": s.error_rate,
+                        "ewma_latency": s.ewma_latency,
+                        "in_flight": s.in_flight,
+                        "cooling_down": s.cooldown_until > time.monotonic(),
+                    } for s in pool]
+                    for pool_name, pool in pools.items()
+                },
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -1,5 +1,10 @@
+import base64
+import gzip
+import hashlib
+import io
 import json
 import os
+import threading
 from typing import Any, Dict
 import pypdfium2 as pdfium
 from PIL import Image
@@ -22,26 +27,109 @@ from camel.agents._utils import (
     safe_model_dump,
 )
 from camel.messages import BaseMessage
+from pdf_toolkit.profiling import profile_stage
+from pdf_toolkit.dedup_index import image_fingerprint
 
-def get_model_response(model,prompt: str,img_list: List[Image.Image]| None = None) -> str:
+# 累计的token用量，用于评估每个表格的调用成本
+_token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
+_token_usage_lock = threading.Lock()
+_thread_token_usage = threading.local()
+
+def get_token_usage() -> Dict[str, int]:
     """
-        LLM的调用接口，输入提示词与图像列表，返回LLM的回复
+        返回自上次reset_token_usage以来累计的token用量
     """
-    input_message = BaseMessage.make_user_message(
-            role_name="User", 
-            content=prompt,
-            image_list= img_list
-        )
-    
-    openai_message = input_message.to_openai_user_message()
-    response = model.run([openai_message])
+    with _token_usage_lock:
+        return dict(_token_usage)
+
+def get_thread_token_usage() -> Dict[str, int]:
+    """
+        返回当前线程累计的token用量（不受reset_token_usage影响）。
+        调用前后对比即可得到一次调用的用量，不会混入其它线程的请求；calls不变说明没有调用模型（例如命中去重索引）
+    """
+    return dict(getattr(_thread_token_usage, "usage", None) or
+                {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0})
+
+def reset_token_usage():
+    with _token_usage_lock:
+        for key in _token_usage:
+            _token_usage[key] = 0
+
+def _record_token_usage(usage: Dict[str, Any]):
+    thread_usage = getattr(_thread_token_usage, "usage", None)
+    if thread_usage is None:
+        thread_usage = _thread_token_usage.usage = {"prompt_tokens": 0, "completion_tokens": 0,
+                                                    "total_tokens": 0, "calls": 0}
+    thread_usage["calls"] += 1
+    with _token_usage_lock:
+        _token_usage["calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            _token_usage[key] += int(usage.get(key) or 0)
+            thread_usage[key] += int(usage.get(key) or 0)
+
+class ImagePayload:
+    """
+        只编码一次的图片：PNG字节、mime类型、sha256以及用于去重的感知哈希。
+        构造消息、去重、重试时都直接复用，不再重复编码为base64
+    """
+    __slots__ = ("data", "mime_type", "sha256", "phash", "width", "height", "_data_url")
+
+    def __init__(self, data: bytes, mime_type: str, width: int, height: int, phash: str = ""):
+        self.data = data
+        self.mime_type = mime_type
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.phash = phash
+        self.width = width
+        self.height = height
+        self._data_url = None
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "ImagePayload":
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return cls(buffer.getvalue(), "image/png", image.width, image.height, image_fingerprint(image))
+
+    @property
+    def data_url(self) -> str:
+        if self._data_url is None:
+            self._data_url = f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+        return self._data_url
+
+    def to_pil(self) -> Image.Image:
+        return Image.open(io.BytesIO(self.data))
+
+
+def make_user_message(prompt: str, img_list: List[Union[Image.Image, ImagePayload]] | None = None) -> Dict[str, Any]:
+    """
+        构造OpenAI格式的用户消息，图片使用ImagePayload中已编码好的data url
+    """
+    if not img_list:
+        return {"role": "user", "content": prompt}
+    content = [{"type": "text", "text": prompt}]
+    for img in img_list:
+        payload = img if isinstance(img, ImagePayload) else ImagePayload.from_image(img)
+        content.append({"type": "image_url", "image_url": {"url": payload.data_url, "detail": "auto"}})
+    return {"role": "user", "content": content}
+
+def get_model_response(model,prompt: str,img_list: List[Union[Image.Image, ImagePayload]]| None = None) -> str:
+    """
+        LLM的调用接口，输入提示词与图像列表（PIL图像或ImagePayload），返回LLM的回复
+    """
+    openai_message = make_user_message(prompt, img_list)
+    with profile_stage("llm.request"):
+        response = model.run([openai_message])
     response = _handle_batch_response(response)
+    _record_token_usage(response.usage_dict)
 
     content = response.output_messages[0].content if response.output_messages else ""
 
     return content
 
 def save_agent_output(output_dir,pdf_name, content_list, table_list):
+    """
+        一次性保存一个pdf的全部结果，每个表格一个json和一个md文件。
+        逐表格增量保存请使用StreamingResultWriter
+    """
     local_pdf_dir = os.path.join(output_dir, pdf_name)
     local_table_dir = os.path.join(local_pdf_dir, "tables")
     local_content_dir = os.path.join(local_pdf_dir, "contents")
@@ -59,14 +147,193 @@ def save_agent_output(output_dir,pdf_name, content_list, table_list):
             f.write(content)
 
 
+class StreamingResultWriter:
+    """
+        增量保存一个pdf的融合结果：每个表格融合完成后立即追加一行到 {pdf_name}.jsonl(.gz)，
+        每写入fsync_every条执行一次fsync，进程中途崩溃时已写入的表格不会丢失。
+        close时写出索引文件 {pdf_name}.index.json，记录每个表格在(解压后)数据流中的偏移与长度。
+        用法：
+            with StreamingResultWriter(output_dir, pdf_name) as writer:
+                agent.extract_with_combined_tables(pdf_file, combined_tool, writer=writer)
+    """
+    def __init__(self, output_dir, pdf_name, compress=False, fsync_every=8):
+        os.makedirs(output_dir, exist_ok=True)
+        suffix = ".jsonl.gz" if compress else ".jsonl"
+        self.path = os.path.join(output_dir, pdf_name + suffix)
+        self.index_path = os.path.join(output_dir, pdf_name + ".index.json")
+        self.pdf_name = pdf_name
+        self.compress = compress
+        self.fsync_every = max(1, fsync_every)
+        self._raw = open(self.path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb") if compress else self._raw
+        self._offset = 0
+        self._pending = 0
+        self._index = []
+        self._lock = threading.Lock()
+
+    def write(self, table_idx, content, table):
+        with profile_stage("writer.json_write"):
+            self._write(table_idx, content, table)
+
+    def _write(self, table_idx, content, table):
+        line = json.dumps({"table_idx": table_idx, "table": table, "content": content},
+                          ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._index.append({"table_idx": table_idx, "offset": self._offset, "length": len(line)})
+            self._offset += len(line)
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        # gzip的flush默认为Z_SYNC_FLUSH，已写入的数据即使没有正常结束也可以被解压读出
+        self._file.flush()
+        if self._file is not self._raw:
+            self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._raw.closed:
+                return
+            self._sync()
+            if self._file is not self._raw:
+                self._file.close()
+            self._raw.close()
+            index = {
+                "pdf_name": self.pdf_name,
+                "path": os.path.basename(self.path),
+                "compressed": self.compress,
+                "records": self._index,
+            }
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_agent_output(output_dir, pdf_name):
+    """
+        读取StreamingResultWriter写出的结果，返回按table_idx排序的content_list, table_list。
+        文件末尾因崩溃而不完整的记录会被忽略
+    """
+    path = os.path.join(output_dir, pdf_name + ".jsonl")
+    opener = open
+    if not os.path.exists(path):
+        path += ".gz"
+        opener = gzip.open
+    records = {}
+    with opener(path, "rb") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                records[record["table_idx"]] = record
+        except EOFError:
+            pass
+    ordered = [records[k] for k in sorted(records)]
+    return [r["content"] for r in ordered], [r["table"] for r in ordered]
+
+
+class FusionCheckpoint:
+    """
+        逐表格的融合状态，保存在 {state_dir}/{pdf_name}.{method}.ckpt.jsonl 中。
+        每个表格融合完成后追加一条记录（候选表格、截图引用、模型原始回复content、解析后的结果）并fsync，
+        进程崩溃或API出错后重新运行时，已完成的表格直接从这里读取，不再重复调用模型。
+        记录按(方法, 提示词, 候选表格)计算的key校验，候选或提示词变化后旧记录不会被使用。
+    """
+    def __init__(self, state_dir, pdf_path, method, prompt=""):
+        os.makedirs(state_dir, exist_ok=True)
+        pdf_name = os.path.basename(pdf_path).split(".")[0]
+        self.path = os.path.join(state_dir, f"{pdf_name}.{method}.ckpt.jsonl")
+        self.method = method
+        self.prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        self.records = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            valid_size = 0
+            with open(self.path, "rb") as f:
+                for line in f:
+                    # 没有换行符的最后一行也视为不完整，否则之后追加的记录会接在它后面
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.records[record["table_idx"]] = record
+                    valid_size += len(line)
+            # 截掉崩溃时写了一半的最后一行，之后追加的记录才能被正确读取
+            if valid_size < os.path.getsize(self.path):
+                os.truncate(self.path, valid_size)
+
+    def key(self, candidates) -> str:
+        data = json.dumps([self.method, self.prompt_hash, candidates], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, table_idx, candidates):
+        """
+            返回已完成的(content, table)，没有记录、候选已变化或记录的结果为空时返回None
+        """
+        record = self.records.get(table_idx)
+        if record is None or record["key"] != self.key(candidates) or not record["table"]:
+            return None
+        return record["content"], record["table"]
+
+    def put(self, table_idx, candidates, crop, content, table):
+        """
+            crop: 截图引用，如{"page_idx": ..., "bbox": ..., "sha256": ...}，纯文本融合时为None
+        """
+        record = {
+            "table_idx": table_idx,
+            "key": self.key(candidates),
+            "candidates": candidates,
+            "crop": crop,
+            "content": content,
+            "table": table,
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[table_idx] = record
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
 class PDFCropper:
     def __init__(self, pdf_path, dpi=192, flatten_page=False):
         self.pdf = pdfium.PdfDocument(pdf_path)
         self.page_images = {}  # 缓存每页渲染好的PIL图
+        self.payloads = {}  # 缓存裁剪并编码好的ImagePayload
         self.dpi = dpi
         self.flatten_page = flatten_page
 
     def _render_page(self, page_id):
+        with profile_stage("pdfium.render_page"):
+            return self._render_page_image(page_id)
+
+    def _render_page_image(self, page_id):
         page = self.pdf[page_id]
         if self.flatten_page:
             page.flatten()
@@ -94,8 +361,46 @@ class PDFCropper:
 
         return cropped_image
 
+    def crop_payload(self, page_id, bbox) -> ImagePayload:
+        """
+        与crop相同，但返回只编码一次的ImagePayload，同一区域重复裁剪时直接复用
+        """
+        key = (int(page_id), tuple(round(float(x), 2) for x in bbox))
+        if key not in self.payloads:
+            self.payloads[key] = ImagePayload.from_image(self.crop(page_id, bbox))
+        return self.payloads[key]
+
+    def crop_parts_payload(self, parts) -> ImagePayload:
+        """
+        crop_parts的ImagePayload版本
+        """
+        if len(parts) == 1:
+            return self.crop_payload(parts[0]["page_idx"], parts[0]["bbox"])
+        key = tuple((int(p["page_idx"]), tuple(round(float(x), 2) for x in p["bbox"])) for p in parts)
+        if key not in self.payloads:
+            self.payloads[key] = ImagePayload.from_image(self.crop_parts(parts))
+        return self.payloads[key]
+
+    def crop_parts(self, parts) -> Image.Image:
+        """
+        跨页表格的截图：按顺序裁剪每一部分并纵向拼接
+        parts: [{"page_idx": ..., "bbox": [left, top, right, bottom]}, ...]
+        """
+        images = [self.crop(int(part["page_idx"]), part["bbox"]) for part in parts]
+        if len(images) == 1:
+            return images[0]
+        width = max(img.width for img in images)
+        stitched = Image.new("RGB", (width, sum(img.height for img in images)), "white")
+        top = 0
+        for img in images:
+            stitched.paste(img, (0, top))
+            top += img.height
+        stitched.format = "png"
+        return stitched
+
     def close(self):
         self.page_images.clear()
+        self.payloads.clear()
         self.pdf.close()
 
 def _handle_batch_response(
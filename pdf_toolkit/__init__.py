@@ -1,14 +1,43 @@
-from .mineru_function import mineru_extractor
-from .docling_function import docling_extractor
-from .marker_function import marker_extractor
-from .markerLLM_function import markerLLM_extractor
-from .cache_decorator import cache_to_folder
-from .combine_function import combinedTool
-
-__all__ = [
-    'mineru_extractor',
-    'docling_extractor',
-    'marker_extractor',
-    'markerLLM_extractor',
-    'cache_to_folder'
-]
\ No newline at end of file
+"""
+各抽取工具依赖的模型库很重，这里按需导入：from pdf_toolkit import marker_extractor 时才加载marker，
+只使用table_grid、table_metrics、profiling等纯Python模块时不会导入整套工具链。
+"""
+import importlib
+
+_EXPORTS = {
+    'mineru_extractor': '.mineru_function',
+    'docling_extractor': '.docling_function',
+    'marker_extractor': '.marker_function',
+    'markerLLM_extractor': '.markerLLM_function',
+    'cache_to_folder': '.cache_decorator',
+    'tool_cache': '.cache_decorator',
+    'get_cache_stats': '.cache_decorator',
+    'combinedTool': '.combine_function',
+    'adaptiveCombinedTool': '.combine_function',
+    'stitch_tables': '.stitch_function',
+    'FusionDedupIndex': '.dedup_index',
+    'enable_profiling': '.profiling',
+    'disable_profiling': '.profiling',
+    'profile_stage': '.profiling',
+    'profile_document': '.profiling',
+    'write_profile_report': '.profiling',
+    'TableCell': '.table_grid',
+    'TableGrid': '.table_grid',
+    'parse_table_html': '.table_grid',
+    'grid_to_html': '.table_grid',
+    'normalize_table_html': '.table_grid',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
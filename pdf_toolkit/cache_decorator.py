@@ -1,15 +1,22 @@
 """
 把工具处理一个pdf的结果缓存入指定文件夹中，若要处理已缓存的文件，直接从指定文件夹中读取结果返回。用于测试
+缓存分两级：进程内按条目数限制大小的LRU（保存反序列化后的结果）在前，磁盘文件夹在后。
+同一文档被反复处理时（例如评估时多种融合配置），第二次起不再访问磁盘。
 """
 import os
+import copy
 import json
 import pickle
 import hashlib
 import functools
+import threading
+from collections import OrderedDict
+from .profiling import profiled
 from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, cast
 
 F = TypeVar('F', bound=Callable[..., Any])
 
+@profiled("cache.json_write")
 def save_tool_results(pdf_name_without_suff, output_folder,extracted_tables):
     output_pdf_dir = os.path.join(output_folder, pdf_name_without_suff)
     os.makedirs(output_pdf_dir, exist_ok=True)
@@ -18,11 +25,15 @@ def save_tool_results(pdf_name_without_suff, output_folder,extracted_tables):
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(item, f, ensure_ascii=False, indent=4)
 
-def load_tool_results(output_folder: str) -> Any:
+@profiled("cache.json_read")
+def load_tool_results(output_folder: str, files: Optional[list] = None) -> Any:
     """
     从指定文件夹中读取所有缓存的json文件，并按编号顺序返回一个列表
+    files: 已经列出的文件名，避免重复listdir
     """
-    files = sorted(os.listdir(output_folder), key=lambda x: int(os.path.splitext(x)[0]))
+    if files is None:
+        files = os.listdir(output_folder)
+    files = sorted(files, key=lambda x: int(os.path.splitext(x)[0]))
     results = []
     for filename in files:
         if filename.endswith(".json"):
@@ -32,6 +43,121 @@ def load_tool_results(output_folder: str) -> Any:
                 results.append(data)
     return results
 
+class LRUCache:
+    """
+    线程安全的LRU缓存，最多保存max_entries条，超出时淘汰最久未使用的条目
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class TieredToolCache:
+    """
+    两级的工具结果缓存：内存LRU -> 磁盘文件夹 -> 调用工具。
+    返回的结果均为深拷贝，调用方修改（例如pop("bbox")）不会污染缓存
+    """
+    def __init__(self, max_entries: int = 256):
+        self.memory = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.disk_writes = 0
+
+    def get(self, tool_dir: str, pdf_path: str, compute: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        读取pdf_path在tool_dir下的缓存结果；两级都未命中时调用compute并写回两级缓存，
+        compute为None时返回None
+        """
+        name_without_suff = os.path.basename(pdf_path).split(".")[0]
+        output_pdf_dir = os.path.join(tool_dir, name_without_suff)
+        self._local.lookups = getattr(self._local, "lookups", 0) + 1
+
+        found, result = self.memory.get(output_pdf_dir)
+        if found:
+            return copy.deepcopy(result)
+
+        try:
+            files = os.listdir(output_pdf_dir)
+        except FileNotFoundError:
+            files = []
+        if files:
+            # 从output_pdf_dir中读取缓存
+            result = load_tool_results(output_pdf_dir, files)
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            with self._lock:
+                self.disk_misses += 1
+            if compute is None:
+                return None
+            # 执行函数并保存结果
+            self._local.computes = getattr(self._local, "computes", 0) + 1
+            result = compute()
+            save_tool_results(name_without_suff, tool_dir, result)
+            with self._lock:
+                self.disk_writes += 1
+            result = copy.deepcopy(result)
+
+        self.memory.put(output_pdf_dir, result)
+        return copy.deepcopy(result)
+
+    def thread_counts(self) -> Tuple[int, int]:
+        """
+        当前线程的(查询次数, 实际调用工具的次数)，调用前后对比可知一次调用是否命中缓存
+        """
+        return getattr(self._local, "lookups", 0), getattr(self._local, "computes", 0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            disk = {"hits": self.disk_hits, "misses": self.disk_misses, "writes": self.disk_writes}
+        return {"memory": self.memory.stats(), "disk": disk}
+
+
+# 所有被cache_to_folder装饰的工具共用的缓存，内存条目数可通过环境变量调整
+tool_cache = TieredToolCache(int(os.environ.get("PDF_TOOL_CACHE_ENTRIES", "256")))
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    返回内存与磁盘两级缓存的命中统计
+    """
+    return tool_cache.stats()
+
+
 def cache_to_folder(tool_name: str, folder_path: str) -> Callable[[F], F]:
     """
     装饰器工厂，创建一个缓存装饰器，将函数的输入输出缓存到指定文件夹
@@ -50,21 +176,8 @@ def cache_to_folder(tool_name: str, folder_path: str) -> Callable[[F], F]:
     def decorator(func: F) -> F:
         @functools.wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            # 将输入参数转换为可哈希的格式
             pdf_path = args[0]
-            name_without_suff = os.path.basename(pdf_path).split(".")[0]
-            output_pdf_dir = os.path.join(output_tool_dir, name_without_suff)
-            
-            # 检测output_pdf_dir是否存在且不为空
-            if os.path.exists(output_pdf_dir) and len(os.listdir(output_pdf_dir)) > 0:
-                # 若存在，从output_pdf_dir中读取缓存
-                result = load_tool_results(output_pdf_dir)
-                return result
-            else:
-                # 若不存在，执行函数并保存结果
-                result = func(*args, **kwargs)
-                save_tool_results(name_without_suff, output_tool_dir, result)
-                return result
+            return tool_cache.get(output_tool_dir, pdf_path, lambda: func(*args, **kwargs))
         
         return cast(F, wrapper)
     
@@ -5,18 +5,153 @@ tool1处理一个pdf文件返回表格[a1,a2,a3]
 tool2处理该pdf文件返回表格[b1,b2,b3,b4]
 最终对齐为[[a1,b2], [a2,b3], [a3,b4]],同一个二元组内是同一个表格的两种工具提取结果
 """
-from typing import Callable, List, Dict, Any, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
 import math
+import time
+from .cache_decorator import tool_cache
+from .table_grid import parse_table_html
+from .table_metrics import cell_f1
+from .stitch_function import stitch_tables, get_page_heights
 
 class combinedTool:
-    def __init__(self,*tools: Callable):
+    """
+    stitch: 是否在对齐后合并跨页的表格，见stitch_function
+    """
+    def __init__(self,*tools: Callable, stitch: bool = False):
         self.tools = tools
+        self.stitch = stitch
     def __call__(self, pdf_path):
         results = [ tool(pdf_path) for tool in self.tools ]
         matched_results = match_tables(results)
+        if self.stitch:
+            matched_results = stitch_tables(matched_results, get_page_heights(pdf_path))
         return matched_results
 
 
+def has_text_layer(pdf_path: str, max_pages: int = 3, min_chars: int = 20) -> bool:
+    """
+    检查pdf前几页是否有文本层（原生电子版pdf），扫描件返回False
+    """
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        return False
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        n_pages = min(len(pdf), max_pages)
+        n_chars = 0
+        for i in range(n_pages):
+            textpage = pdf[i].get_textpage()
+            n_chars += textpage.count_chars()
+            textpage.close()
+        return n_pages > 0 and n_chars >= min_chars * n_pages
+    finally:
+        pdf.close()
+
+
+def table_is_sane(table: Dict[str, Any], min_fill: float = 0.9, max_empty: float = 0.5) -> bool:
+    """
+    table_body结构是否合理：至少两行、网格基本填满、空单元格不过多、bbox有效
+    """
+    bbox = table.get("bbox")
+    if not bbox or len(bbox) != 4 or bbox[2] <= bbox[0] or bbox[3] <= bbox[1]:
+        return False
+    grid = parse_table_html(table.get("table_body") or "")
+    if grid.n_rows < 2 or grid.n_cols < 1:
+        return False
+    filled = sum(1 for idx in grid.slots if idx >= 0)
+    if filled < min_fill * len(grid.slots):
+        return False
+    empty = sum(1 for cell in grid.cells if not cell.text)
+    return empty <= max_empty * len(grid.cells)
+
+
+class adaptiveCombinedTool:
+    """
+    按需调用工具的combinedTool。
+    先运行最快的工具，若文档有文本层、检测到表格、且所有表格结构合理，则直接采用该工具的结果；
+    否则再运行下一个工具，两者检测到的表格一一对应、且每组内容的cell-F1都不低于agree_f1时停止，
+    仍有分歧时运行全部工具并按多数投票对齐。
+    返回值与combinedTool相同，每组长度等于工具数，未运行的工具位置为None。
+    tools: 工具，默认按给定顺序视为从快到慢；运行后按实测的平均耗时重新排序，
+           命中cache_to_folder缓存的调用不计入耗时，只有实际运行过的工具才参与重新排序
+    agree_f1: 前两个工具的结果视为一致所需的单元格F1
+    stitch: 是否在对齐后合并跨页的表格
+    """
+    def __init__(self, *tools: Callable, iou_threshold: float = 0.70, agree_f1: float = 0.9, stitch: bool = False):
+        self.tools = tools
+        self.iou_threshold = iou_threshold
+        self.agree_f1 = agree_f1
+        self.stitch = stitch
+        self.tool_seconds = [0.0] * len(tools)
+        self.tool_runs = [0] * len(tools)
+        self.documents = 0
+        self.tools_used = 0
+
+    def _order(self) -> List[int]:
+        def expected_seconds(i):
+            if self.tool_runs[i] == 0:
+                return (1, i)
+            return (0, self.tool_seconds[i] / self.tool_runs[i])
+        return sorted(range(len(self.tools)), key=expected_seconds)
+
+    def _run(self, i: int, pdf_path: str) -> List[Dict[str, Any]]:
+        lookups, computes = tool_cache.thread_counts()
+        start = time.perf_counter()
+        result = self.tools[i](pdf_path)
+        elapsed = time.perf_counter() - start
+        new_lookups, new_computes = tool_cache.thread_counts()
+        # 命中缓存的调用只有读缓存的耗时，不能代表工具本身的速度
+        if new_lookups == lookups or new_computes > computes:
+            self.tool_seconds[i] += elapsed
+            self.tool_runs[i] += 1
+        self.tools_used += 1
+        return result
+
+    def _agree(self, a: Optional[Dict[str, Any]], b: Optional[Dict[str, Any]]) -> bool:
+        if a is None or b is None:
+            return False
+        return cell_f1(a.get("table_body", ""), b.get("table_body", ""))["f1"] >= self.agree_f1
+
+    def _match(self, results, min_votes):
+        return match_tables([r if r is not None else [] for r in results], self.iou_threshold, min_votes)
+
+    def __call__(self, pdf_path):
+        groups = self._select(pdf_path)
+        if self.stitch:
+            groups = stitch_tables(groups, get_page_heights(pdf_path))
+        return groups
+
+    def _select(self, pdf_path):
+        self.documents += 1
+        order = self._order()
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(self.tools)
+
+        first = order[0]
+        results[first] = self._run(first, pdf_path)
+        if (results[first] and has_text_layer(pdf_path)
+                and all(table_is_sane(tbl) for tbl in results[first])):
+            return self._match(results, 1)
+
+        if len(order) > 1:
+            second = order[1]
+            results[second] = self._run(second, pdf_path)
+            groups = self._match(results, 1)
+            if len(order) == 2 or all(self._agree(grp[first], grp[second]) for grp in groups):
+                return self._match(results, min(2, len(order)))
+
+        for i in order[2:]:
+            results[i] = self._run(i, pdf_path)
+        return self._match(results, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "tools_per_document": self.tools_used / self.documents if self.documents else 0.0,
+            "mean_seconds": [s / n if n else None for s, n in zip(self.tool_seconds, self.tool_runs)],
+        }
+
+
 def _iou(b1: List[float], b2: List[float]) -> float:
     left   = max(b1[0], b2[0])
     top    = max(b1[1], b2[1])
@@ -35,13 +170,15 @@ def _iou(b1: List[float], b2: List[float]) -> float:
 def match_tables(
     tools_tables: List[List[Dict[str, Any]]],
     iou_threshold: float = 0.70,
+    min_votes: Optional[int] = None,
 ) -> List[List[Dict[str, Any]]]:
     """
     将多个工具检测到的表格对齐，并只保留被“超过半数”工具检测到的表格。
+    min_votes: 保留一组所需的最少工具数，默认为严格超过半数
     返回值中的各组按 (page_idx, top, left) 升序排序。
     """
     n_tools = len(tools_tables)
-    majority = n_tools // 2 + 1      # 严格超过半数
+    majority = n_tools // 2 + 1 if min_votes is None else min_votes     # 默认严格超过半数
 
     groups: List[List[Any]] = []     # 每组对应一个真实表格
     reps:   List[Tuple[int, List[float]]] = []  # 代表框 (page_idx, bbox) 与 groups 同步
@@ -72,7 +209,7 @@ def match_tables(
     ]
 
     otn = ",".join([str(len(tt)) for tt in tools_tables])
-    print(f"原始表格数为：{otn}\n保留了：{len(kept)}\n保留率为：{len(kept)/len(reps)*100}%")
+    print(f"原始表格数为：{otn}\n保留了：{len(kept)}\n保留率为：{len(kept)/max(len(reps),1)*100}%")
 
     # 按 (page_idx, bbox_top, bbox_left) 排序
     kept.sort(key=lambda item: (int(item[1][0]), item[1][1][1], item[1][1][0]))
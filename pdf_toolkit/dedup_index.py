@@ -0,0 +1,107 @@
+"""
+跨文档的融合结果去重。
+很多文档中包含完全相同的模板表格（费率表、法律条款表等），每次出现都要付出一次LLM融合调用。
+这里对一组候选表格计算指纹（各工具规范化后的HTML、标题、脚注，以及表格截图的哈希），
+融合过一次的组在之后的文档与任务中直接复用融合结果。
+指纹与结果保存在文件夹中（folder/xx/<指纹>.json），可在多个任务之间共享，前面有一层内存LRU。
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .cache_decorator import LRUCache
+from .table_grid import normalize_table_html
+
+
+def _normalize_text(text: Optional[str]) -> str:
+    return " ".join((text or "").split())
+
+
+def image_fingerprint(image) -> str:
+    """
+    截图的哈希：缩小为32x32灰度图并量化到16级后取sha1，对不同工具bbox的细微偏差不敏感
+    传入ImagePayload时直接使用其编码时算好的哈希
+    """
+    phash = getattr(image, "phash", None)
+    if phash:
+        return phash
+    small = image.convert("L").resize((32, 32))
+    quantized = bytes(v >> 4 for v in small.tobytes())
+    return hashlib.sha1(quantized).hexdigest()
+
+
+def group_fingerprint(tables: List[Optional[Dict[str, Any]]], mode: str, image_hash: str = "") -> str:
+    """
+    一组候选表格的指纹，与page_idx、bbox无关
+    mode: 融合方法、提示词模板哈希与模型的标识，其中任一项不同的结果不会互相复用
+    """
+    h = hashlib.sha256()
+    h.update(mode.encode("utf-8"))
+    for table in tables:
+        h.update(b"\x00")
+        if table is None:
+            h.update(b"-")
+            continue
+        for part in (normalize_table_html(table.get("table_body") or ""),
+                     _normalize_text(table.get("table_caption")),
+                     _normalize_text(table.get("table_footnote"))):
+            h.update(part.encode("utf-8"))
+            h.update(b"\x01")
+    h.update(image_hash.encode("utf-8"))
+    return h.hexdigest()
+
+
+class FusionDedupIndex:
+    """
+    融合结果的全局去重索引
+    用法：
+        index = FusionDedupIndex("./dedup_index")
+        agent = TableOptimizationAgent(model=model, dedup_index=index)
+    """
+    def __init__(self, folder_path: str, max_entries: int = 4096):
+        self.folder_path = folder_path
+        os.makedirs(folder_path, exist_ok=True)
+        self.memory = LRUCache(max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.folder_path, fingerprint[:2], fingerprint + ".json")
+
+    def get(self, fingerprint: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        返回已保存的(content, fused_table)，不存在时返回None
+        """
+        found, record = self.memory.get(fingerprint)
+        if not found:
+            try:
+                with open(self._path(fingerprint), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+            except (FileNotFoundError, ValueError):
+                record = None
+            if record is not None:
+                self.memory.put(fingerprint, record)
+        with self._lock:
+            if record is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return record["content"], copy.deepcopy(record["table"])
+
+    def put(self, fingerprint: str, content: str, table: Dict[str, Any]) -> None:
+        record = {"content": content, "table": copy.deepcopy(table)}
+        path = self._path(fingerprint)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，多个任务同时写同一指纹时不会读到半个文件
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.memory.put(fingerprint, record)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
@@ -1,10 +1,17 @@
 from typing import List, Dict, Any
+import functools
 import logging
 import os
 import json
 from pathlib import Path
 from docling.document_converter import DocumentConverter
 from .cache_decorator import cache_to_folder
+from .profiling import profile_stage
+
+@functools.lru_cache(maxsize=1)
+def _document_converter() -> DocumentConverter:
+    """进程内共享的DocumentConverter"""
+    return DocumentConverter()
 
 @cache_to_folder("docling","/Users/qimai/Desktop/workspace/deepResearch/pdf_extract_agent/single_table_output/tool")
 def docling_extractor(pdf_path: str) -> List[Dict[str, Any]]:
@@ -25,8 +32,10 @@ def docling_extractor(pdf_path: str) -> List[Dict[str, Any]]:
     
 
     # Convert PDF to structured document
-    doc_converter = DocumentConverter()
-    conv_res = doc_converter.convert(Path(pdf_path))
+    with profile_stage("docling.load_models"):
+        doc_converter = _document_converter()
+    with profile_stage("docling.convert"):
+        conv_res = doc_converter.convert(Path(pdf_path))
     
     extracted_tables = []
     
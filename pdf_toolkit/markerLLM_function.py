@@ -1,9 +1,11 @@
 from typing import List, Dict, Any
+import functools
 import logging
 import os
 import json
 from pathlib import Path
 from .cache_decorator import cache_to_folder
+from .profiling import profile_stage
 from marker.converters.table import TableConverter
 from marker.converters.pdf import PdfConverter
 from marker.models import create_model_dict
@@ -17,6 +19,11 @@ from marker.renderers.markdown import MarkdownOutput
 from marker.schema.blocks import BlockOutput
 from marker.schema import BlockTypes
 
+@functools.lru_cache(maxsize=1)
+def _model_dict():
+    """进程内共享的marker模型字典"""
+    return create_model_dict()
+
 # @cache_to_folder("markerLLM","/Users/qimai/Desktop/workspace/deepResearch/pdf_extract_agent/single_table_output/tool")
 def markerLLM_extractor(pdf_path: str) -> List[Dict[str, Any]]:
     """
@@ -44,13 +51,15 @@ def markerLLM_extractor(pdf_path: str) -> List[Dict[str, Any]]:
     }
     config_parser = ConfigParser(config)
 
-    converter = TableConverter(
-        config=config_parser.generate_config_dict(),
-        artifact_dict=create_model_dict(),
-        renderer=config_parser.get_renderer(),
-        llm_service=config_parser.get_llm_service()
-    )
-    rendered = converter(pdf_path)
+    with profile_stage("markerLLM.load_models"):
+        converter = TableConverter(
+            config=config_parser.generate_config_dict(),
+            artifact_dict=_model_dict(),
+            renderer=config_parser.get_renderer(),
+            llm_service=config_parser.get_llm_service()
+        )
+    with profile_stage("markerLLM.convert"):
+        rendered = converter(pdf_path)
 
     def find_all_table(rendered):
         if rendered.block_type=="Table":
@@ -1,23 +1,176 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
 import os
+import gc
+import sys
 import json
+import threading
+import psutil
 from .cache_decorator import cache_to_folder
-import tempfile
-import sys
+from .profiling import profile_stage
 sys.path.append('/Users/qimai/Desktop/workspace/deepResearch/all_lib/MinerU')
-from magic_pdf.data.data_reader_writer import FileBasedDataReader, FileBasedDataWriter
+import fitz
+from magic_pdf.data.data_reader_writer import FileBasedDataReader, DataWriter
 from magic_pdf.data.dataset import PymuDocDataset
 from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
 from magic_pdf.config.enums import SupportedPdfParseMethod
 
+# 每批处理的页数，扫描件OCR时限制峰值内存
+PAGE_BATCH_SIZE = int(os.environ.get("MINERU_PAGE_BATCH_SIZE", "16"))
+
+
+class _DiscardImageWriter(DataWriter):
+    """
+    只保留表格的HTML，MinerU切出的图片不落盘，只统计原本要写入的字节数
+    """
+    def __init__(self):
+        self.discarded_bytes = 0
+
+    def write(self, path: str, data: bytes) -> None:
+        self.discarded_bytes += len(data)
+
+
+def _rss_mb() -> float:
+    """
+    当前进程的常驻内存。不用ru_maxrss：它是整个进程生命周期的峰值，批量运行或常驻worker中
+    之后的每个文档都会报告之前最大文档的峰值
+    """
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+
+class _RSSMonitor(threading.Thread):
+    """
+    批次处理期间在后台按固定间隔采样常驻内存，记录其间的最高值：
+        with _RSSMonitor() as monitor:
+            ...
+        monitor.peak_mb
+    """
+    def __init__(self, interval: float = 0.05):
+        super().__init__(name="mineru_rss_monitor", daemon=True)
+        self.interval = interval
+        self.peak_mb = _rss_mb()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, _rss_mb())
+
+    def __enter__(self) -> "_RSSMonitor":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop_event.set()
+        self.join()
+        self.peak_mb = max(self.peak_mb, _rss_mb())
+
+
+# 本进程最近一次实际运行（未命中缓存）的内存统计
+_last_memory_stats: Dict[str, Any] = {}
+
+
+def get_memory_stats() -> Dict[str, Any]:
+    """
+    返回最近一次实际运行mineru_extractor的内存统计：
+    pdf_name, mode(OCR/TXT), batches, rss_before_mb, rss_peak_mb(各批次处理期间采样的最高值),
+    rss_after_mb, discarded_image_mb
+    """
+    return dict(_last_memory_stats)
+
+
+def _iter_page_batches(pdf_bytes: bytes, batch_size: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    把pdf按batch_size页切分，返回(起始页码, 该批次的pdf字节)
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        n_pages = doc.page_count
+        if batch_size <= 0 or n_pages <= batch_size:
+            yield 0, pdf_bytes
+            return
+        for start in range(0, n_pages, batch_size):
+            sub_doc = fitz.open()
+            sub_doc.insert_pdf(doc, from_page=start, to_page=min(start + batch_size, n_pages) - 1)
+            batch_bytes = sub_doc.tobytes()
+            sub_doc.close()
+            yield start, batch_bytes
+    finally:
+        doc.close()
+
+
+def _release_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+def _warm_up():
+    """
+    加载MinerU的模型单例（TXT与OCR两种模式各一份），常驻进程启动时调用，避免第一个文档承担模型加载的耗时
+    """
+    doc = fitz.open()
+    doc.new_page()
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    for ocr in (False, True):
+        PymuDocDataset(pdf_bytes).apply(doc_analyze, ocr=ocr)
+    _release_memory()
+
+
+def _extract_batch(batch_bytes: bytes, ocr: bool, page_offset: int,
+                   image_writer: DataWriter) -> List[Dict[str, Any]]:
+    ds = PymuDocDataset(batch_bytes)
+    with profile_stage("mineru.doc_analyze"):
+        infer_result = ds.apply(doc_analyze, ocr=ocr)
+    if ocr:
+        with profile_stage("mineru.pipe_ocr_mode"):
+            pipe_result = infer_result.pipe_ocr_mode(image_writer)
+    else:
+        with profile_stage("mineru.pipe_txt_mode"):
+            pipe_result = infer_result.pipe_txt_mode(image_writer)
+
+    # 获取内容列表
+    content_list_content = pipe_result.get_content_list("images")
+
+    bbox_list = []
+    for page in pipe_result._pipe_res['pdf_info']:
+        for table in page['tables']:
+            bbox_list.append(table['bbox'])
+
+    # 提取表格内容
+    i = 0
+    extracted_tables = []
+    for item in content_list_content:
+        if item.get("type") == "table":
+            table_entry = {
+                "table_body": item.get("table_body", ""),
+                "table_caption": "\n".join(item.get("table_caption", [])),
+                "table_footnote": "\n".join(item.get("table_footnote", [])),
+                "page_idx": str(int(item.get("page_idx", 0)) + page_offset),
+                "bbox": bbox_list[i]
+            }
+            i += 1
+            extracted_tables.append(table_entry)
+
+    del ds, infer_result, pipe_result, content_list_content
+    return extracted_tables
+
 
 @cache_to_folder("minerU","/Users/qimai/Desktop/workspace/deepResearch/pdf_extract_agent/single_table_output/tool")
-def mineru_extractor(pdf_path: str) -> List[Dict[str, Any]]:
+def mineru_extractor(pdf_path: str, page_batch_size: int = PAGE_BATCH_SIZE) -> List[Dict[str, Any]]:
     r"""
     Extract tables from a PDF file using mineru library.
 
+    Only tables are kept: images cropped by MinerU are discarded instead of being
+    written to disk, and the document is analyzed in batches of `page_batch_size`
+    pages so that peak memory stays bounded on large scanned documents.
+
     Args:
         pdf_path (str): Path to the PDF file.
+        page_batch_size (int): Number of pages analyzed per batch, <=0 means all pages at once.
 
     Returns:
         List[Dict[str, Any]]: A list of dictionaries where each dictionary represents a table.
@@ -28,59 +181,44 @@ def mineru_extractor(pdf_path: str) -> List[Dict[str, Any]]:
                 - 'page_idx' (str): The page index where the table was found.
 
     """
-
-    # sys.path.append('/Users/qimai/Desktop/workspace/deepResearch/all_lib/MinerU')
     # 读取PDF文件内容
     reader = FileBasedDataReader("")
     pdf_bytes = reader.read(pdf_path)
-    
-    # 创建临时文件夹来存储图片
-    with tempfile.TemporaryDirectory() as temp_dir:
-        local_image_dir = temp_dir
-        image_dir = str(os.path.basename(local_image_dir))
-        image_writer = FileBasedDataWriter(local_image_dir)
 
-        # 创建数据集实例
+    # 分类PDF解析方法（在整个文档上进行一次）
+    with profile_stage("mineru.classify"):
         ds = PymuDocDataset(pdf_bytes)
-        
-        # 分类PDF解析方法
-        parse_method = ds.classify()
-        
-        # 应用解析模型
-        if parse_method == SupportedPdfParseMethod.OCR:
-            infer_result = ds.apply(doc_analyze, ocr=True)
-            pipe_result = infer_result.pipe_ocr_mode(image_writer)
-        else:
-            infer_result = ds.apply(doc_analyze, ocr=False)
-            pipe_result = infer_result.pipe_txt_mode(image_writer)
-        
-        # 获取内容列表
-        content_list_content = pipe_result.get_content_list(image_dir)
-        
-        bbox_list = []
-        for page in pipe_result._pipe_res['pdf_info']:
-            for table in page['tables']:
-                bbox_list.append(table['bbox'])
-
-        # 提取表格内容
-        i = 0
-        extracted_tables = []
-        for item in content_list_content:
-            if item.get("type") == "table":
-                table_entry = {
-                    "table_body": item.get("table_body", ""),
-                    "table_caption": "\n".join(item.get("table_caption", [])),
-                    "table_footnote": "\n".join(item.get("table_footnote", [])),
-                    "page_idx": str(item.get("page_idx", "")),
-                    "bbox": bbox_list[i]
-                }
-                i += 1
-                extracted_tables.append(table_entry)
-
-        # name_without_suff = os.path.basename(pdf_path).split(".")[0]
-        # save_tool_results(name_without_suff,"/Users/qimai/Desktop/workspace/deepResearch/pdf_extract_agent/tool_output/mineru",extracted_tables)
-        
-        return extracted_tables
+        ocr = ds.classify() == SupportedPdfParseMethod.OCR
+    del ds
+
+    image_writer = _DiscardImageWriter()
+    extracted_tables = []
+    n_batches = 0
+    rss_before = _rss_mb()
+    rss_peak = rss_before
+    for page_offset, batch_bytes in _iter_page_batches(pdf_bytes, page_batch_size):
+        with _RSSMonitor() as monitor:
+            extracted_tables += _extract_batch(batch_bytes, ocr, page_offset, image_writer)
+        rss_peak = max(rss_peak, monitor.peak_mb)
+        n_batches += 1
+        del batch_bytes
+        _release_memory()
+
+    stats = {
+        "pdf_name": os.path.basename(pdf_path),
+        "mode": "OCR" if ocr else "TXT",
+        "batches": n_batches,
+        "rss_before_mb": rss_before,
+        "rss_peak_mb": rss_peak,
+        "rss_after_mb": _rss_mb(),
+        "discarded_image_mb": image_writer.discarded_bytes / 1024 / 1024,
+    }
+    _last_memory_stats.clear()
+    _last_memory_stats.update(stats)
+    print(f"MinerU {stats['mode']}模式处理{stats['pdf_name']}：{n_batches}批，"
+          f"内存{rss_before:.0f}MB -> 处理期间最高{rss_peak:.0f}MB(+{rss_peak - rss_before:.0f}MB) "
+          f"-> 结束时{stats['rss_after_mb']:.0f}MB，未落盘的图片{stats['discarded_image_mb']:.1f}MB")
+    return extracted_tables
     
 # 示例用法
 if __name__ == "__main__":
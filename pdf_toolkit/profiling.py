@@ -0,0 +1,225 @@
+"""
+抽取流程各阶段的性能分析，默认关闭，关闭时profile_stage几乎没有开销。
+开启方式：
+    - 代码中调用 enable_profiling("./profile", mode="cprofile")
+    - 或设置环境变量 PDF_AGENT_PROFILE=cprofile|sampling（1/true等同cprofile，输出目录为 PDF_AGENT_PROFILE_DIR，默认./profile）
+模式：
+    - cprofile: 每个阶段用cProfile记录，按阶段（或按文档+阶段）合并，输出 .prof 与前若干个函数的 .txt
+    - sampling: 后台线程按固定间隔对处于阶段中的线程采样调用栈，输出flamegraph.pl/speedscope可读的
+                折叠栈文件 flamegraph.collapsed
+两种模式都会输出每个阶段的调用次数与墙钟耗时 stage_times.json。
+阶段嵌套时只对最外层阶段做cProfile，内层阶段仍然计时。
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import warnings
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+_config: Dict[str, Any] = {"enabled": False, "mode": "cprofile", "output_dir": "./profile", "per_document": False}
+_lock = threading.Lock()
+_local = threading.local()
+_stage_times: Dict[str, Dict[str, float]] = defaultdict(lambda: {"calls": 0, "seconds": 0.0})
+_stats: Dict[str, pstats.Stats] = {}
+_sampler: Optional["_Sampler"] = None
+
+
+class _Sampler(threading.Thread):
+    """
+    对处于阶段中的线程采样调用栈，累计为折叠栈
+    """
+    def __init__(self, interval: float):
+        super().__init__(name="pdf_agent_profiler", daemon=True)
+        self.interval = interval
+        self.active: Dict[int, str] = {}
+        self.counts: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, key in list(self.active.items()):
+                frame = frames.get(thread_id)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                names.append(key.replace("/", ";"))
+                with _lock:
+                    self.counts[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def enable_profiling(output_dir: str = "./profile", mode: str = "cprofile",
+                     per_document: bool = False, interval: float = 0.005) -> None:
+    """
+    mode: "cprofile" 或 "sampling"
+    per_document: 为True时按(文档, 阶段)分别汇总，否则只按阶段汇总
+    interval: sampling模式的采样间隔（秒）
+    """
+    global _sampler
+    if mode not in ("cprofile", "sampling"):
+        raise ValueError(f"unknown profiling mode: {mode}")
+    _config.update(enabled=True, mode=mode, output_dir=output_dir, per_document=per_document)
+    if mode == "sampling" and _sampler is None:
+        _sampler = _Sampler(interval)
+        _sampler.start()
+
+
+def disable_profiling() -> None:
+    global _sampler
+    _config["enabled"] = False
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+
+
+def profiling_enabled() -> bool:
+    return _config["enabled"]
+
+
+def _stage_key(stage: str) -> str:
+    document = getattr(_local, "document", None)
+    if _config["per_document"] and document:
+        return f"{document}/{stage}"
+    return stage
+
+
+@contextmanager
+def profile_document(name: str):
+    """
+    标记当前线程正在处理的文档，per_document模式下各阶段按文档分别汇总
+    """
+    previous = getattr(_local, "document", None)
+    _local.document = name
+    try:
+        yield
+    finally:
+        _local.document = previous
+
+
+@contextmanager
+def profile_stage(stage: str):
+    """
+    记录一个阶段，例如 with profile_stage("docling.convert"): ...
+    """
+    if not _config["enabled"]:
+        yield
+        return
+
+    key = _stage_key(stage)
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    profiler = None
+    sampler = _sampler
+    thread_id = threading.get_ident()
+    if depth == 0:
+        if _config["mode"] == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif sampler is not None:
+            sampler.active[thread_id] = key
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.depth = depth
+        if profiler is not None:
+            profiler.disable()
+        if depth == 0 and sampler is not None:
+            sampler.active.pop(thread_id, None)
+        with _lock:
+            _stage_times[key]["calls"] += 1
+            _stage_times[key]["seconds"] += elapsed
+            if profiler is not None:
+                if key in _stats:
+                    _stats[key].add(profiler)
+                else:
+                    _stats[key] = pstats.Stats(profiler)
+
+
+def profiled(stage: str) -> Callable:
+    """
+    profile_stage的装饰器形式
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def write_profile_report(output_dir: Optional[str] = None, top_n: int = 40) -> Optional[str]:
+    """
+    写出汇总报告，返回输出目录；未记录任何阶段时返回None
+    """
+    output_dir = output_dir or _config["output_dir"]
+    with _lock:
+        stage_times = {k: dict(v) for k, v in _stage_times.items()}
+        stats = dict(_stats)
+        counts = Counter(_sampler.counts) if _sampler is not None else Counter()
+    if not stage_times:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(os.path.join(output_dir, "stage_times.json"), "w", encoding="utf-8") as f:
+        ordered = dict(sorted(stage_times.items(), key=lambda item: item[1]["seconds"], reverse=True))
+        json.dump(ordered, f, ensure_ascii=False, indent=4)
+
+    for key, stage_stats in stats.items():
+        file_name = key.replace("/", "__")
+        stage_stats.dump_stats(os.path.join(output_dir, f"{file_name}.prof"))
+        buffer = io.StringIO()
+        pstats.Stats(os.path.join(output_dir, f"{file_name}.prof"), stream=buffer) \
+            .sort_stats("cumulative").print_stats(top_n)
+        with open(os.path.join(output_dir, f"{file_name}.txt"), "w", encoding="utf-8") as f:
+            f.write(buffer.getvalue())
+
+    if counts:
+        with open(os.path.join(output_dir, "flamegraph.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+    return output_dir
+
+
+def reset_profiling() -> None:
+    with _lock:
+        _stage_times.clear()
+        _stats.clear()
+        if _sampler is not None:
+            _sampler.counts.clear()
+
+
+def _enable_from_env() -> None:
+    """
+    PDF_AGENT_PROFILE=cprofile|sampling；1/true/yes/on视为cprofile，0/false/no/off或空值不开启。
+    在导入时执行，无法识别的值只给出警告，不能让所有入口（包括服务的worker）导入失败
+    """
+    value = os.environ.get("PDF_AGENT_PROFILE", "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return
+    if value in ("1", "true", "yes", "on"):
+        value = "cprofile"
+    if value not in ("cprofile", "sampling"):
+        warnings.warn(f"ignoring PDF_AGENT_PROFILE={os.environ['PDF_AGENT_PROFILE']!r}, "
+                      f"expected cprofile or sampling; profiling stays disabled")
+        return
+    enable_profiling(os.environ.get("PDF_AGENT_PROFILE_DIR", "./profile"), value)
+
+
+_enable_from_env()
@@ -0,0 +1,138 @@
+"""
+跨页表格拼接，在match_tables之后执行。
+match_tables按page_idx分组，跨页的同一个表格会得到多个组，每组都要单独调用一次LLM融合。
+这里把相邻两页上"前一页最后一个表格"与"后一页第一个表格"判定为续表时合并为一组：
+    - 两部分的列数一致
+    - 后一部分重复了前一部分的表头，或者后一部分没有自己的标题
+    - 已知页面高度时，前一部分位于页面底部、后一部分位于页面顶部
+合并后的表格保留第一部分的page_idx、bbox与标题，并在stitched_parts中记录每一部分的(page_idx, bbox)，
+用于VLM方法拼接截图。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+from .table_grid import TableCell, TableGrid, parse_table_html
+
+
+def get_page_heights(pdf_path: str) -> List[float]:
+    """
+    读取pdf每一页的高度（pt）
+    """
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return [pdf.get_page_size(i)[1] for i in range(len(pdf))]
+    finally:
+        pdf.close()
+
+
+def crop_parts(table: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    表格在pdf中的区域：跨页拼接的表格为各部分的(page_idx, bbox)，否则为单个(page_idx, bbox)
+    """
+    return table.get("stitched_parts") or [{"page_idx": table["page_idx"], "bbox": table["bbox"]}]
+
+
+def without_position(table: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    去掉bbox、stitched_parts等定位信息后的表格副本（传给模型的内容），不修改原表格
+    """
+    if table is None:
+        return None
+    return {k: v for k, v in table.items() if k not in ("bbox", "stitched_parts")}
+
+
+def _first_row(grid: TableGrid) -> List[str]:
+    return grid.row_texts(0) if grid.n_rows else []
+
+
+def _is_continuation(prev: Dict[str, Any], cur: Dict[str, Any],
+                     page_heights: Optional[Sequence[float]], edge_ratio: float) -> Optional[bool]:
+    """
+    根据一个工具的结果判断cur是否为prev的续表，返回None表示无法判断（表格为空）
+    """
+    prev_grid = parse_table_html(prev.get("table_body") or "")
+    cur_grid = parse_table_html(cur.get("table_body") or "")
+    if prev_grid.n_cols == 0 or cur_grid.n_cols == 0:
+        return None
+    if prev_grid.n_cols != cur_grid.n_cols:
+        return False
+
+    header_repeated = _first_row(prev_grid) == _first_row(cur_grid)
+    if not header_repeated and (cur.get("table_caption") or "").strip():
+        return False
+
+    if page_heights:
+        last = crop_parts(prev)[-1]
+        prev_height = page_heights[int(last["page_idx"])]
+        cur_height = page_heights[int(cur["page_idx"])]
+        if last["bbox"][3] < prev_height * (1 - edge_ratio) or cur["bbox"][1] > cur_height * edge_ratio:
+            return False
+    return True
+
+
+def _merge(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, Any]:
+    prev_grid = parse_table_html(prev.get("table_body") or "")
+    cur_grid = parse_table_html(cur.get("table_body") or "")
+
+    # 续表重复的表头行只保留一份
+    skip = 0
+    n_header = prev_grid.header_row_count() or 1
+    while skip < min(n_header, cur_grid.n_rows) and cur_grid.row_texts(skip) == prev_grid.row_texts(skip):
+        skip += 1
+
+    cells = [TableCell(c.row, c.col, c.rowspan, c.colspan, c.is_header, c.content, c.text)
+             for c in prev_grid.cells]
+    offset = prev_grid.n_rows - skip
+    for c in cur_grid.cells:
+        if c.row < skip:
+            continue
+        cells.append(TableCell(c.row + offset, c.col, c.rowspan, c.colspan, c.is_header, c.content, c.text))
+
+    merged = dict(prev)
+    merged["table_body"] = TableGrid.from_cells(cells).to_html()
+    merged["table_footnote"] = cur.get("table_footnote") or prev.get("table_footnote", "")
+    merged["stitched_parts"] = crop_parts(prev) + crop_parts(cur)
+    return merged
+
+
+def stitch_tables(
+    groups: List[List[Optional[Dict[str, Any]]]],
+    page_heights: Optional[Sequence[float]] = None,
+    edge_ratio: float = 0.3,
+) -> List[List[Optional[Dict[str, Any]]]]:
+    """
+    合并match_tables输出中跨页的表格组，输入需按(page_idx, top, left)排序。
+    只有同时检测到两部分的工具会得到合并后的表格，其余工具的位置置为None；
+    这些工具中多数判定为续表时才合并。
+    """
+    if not groups:
+        return []
+
+    def page_of(group, last=False) -> int:
+        for tbl in group:
+            if tbl is not None:
+                return int(crop_parts(tbl)[-1]["page_idx"] if last else tbl["page_idx"])
+        return -1
+
+    stitched = [list(groups[0])]
+    n_stitched = 0
+    for group in groups[1:]:
+        prev = stitched[-1]
+        # 各组已排序，prev结束于第p页且group位于第p+1页时，二者分别是两页上的最后一个与第一个表格
+        if page_of(prev, last=True) + 1 == page_of(group):
+            votes = [
+                _is_continuation(p, c, page_heights, edge_ratio)
+                for p, c in zip(prev, group) if p is not None and c is not None
+            ]
+            votes = [v for v in votes if v is not None]
+            if votes and sum(votes) * 2 > len(votes):
+                stitched[-1] = [
+                    _merge(p, c) if p is not None and c is not None else None
+                    for p, c in zip(prev, group)
+                ]
+                n_stitched += 1
+                continue
+        stitched.append(list(group))
+
+    if n_stitched:
+        print(f"跨页拼接了：{n_stitched}处\n拼接后表格数为：{len(stitched)}")
+    return stitched
@@ -0,0 +1,284 @@
+"""
+表格的紧凑内部表示。
+把工具输出的table_body（HTML字符串）解析为单元格网格，rowspan/colspan已展开：
+    grid = parse_table_html("<table><tr><td rowspan=2>a</td><td>b</td></tr><tr><td>c</td></tr></table>")
+    grid.shape          -> (2, 2)
+    grid.text_at(1, 0)  -> "a"   (被rowspan覆盖的位置指向同一个单元格)
+    grid.to_html()      -> 规范化后的HTML
+网格位置到单元格的映射存放在扁平的array中，单元格对象使用__slots__，
+便于投票、比较、打分、压缩提示词等操作直接在网格上进行，而不必反复解析HTML。
+"""
+import functools
+import html
+import re
+from array import array
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+_CELL_TAGS = ("td", "th")
+_VOID_TAGS = ("br", "img", "hr", "wbr")
+_MAX_SPAN = 1000  # 防止异常的span值撑爆网格
+_WS_RE = re.compile(r"\s+")
+
+
+class TableCell:
+    """
+    一个(可能跨行跨列的)单元格。
+    row, col为左上角位置；content为单元格内部的原始HTML；text为去掉标签、压缩空白后的纯文本
+    """
+    __slots__ = ("row", "col", "rowspan", "colspan", "is_header", "content", "text")
+
+    def __init__(self, row: int, col: int, rowspan: int = 1, colspan: int = 1,
+                 is_header: bool = False, content: str = "", text: str = ""):
+        self.row = row
+        self.col = col
+        self.rowspan = rowspan
+        self.colspan = colspan
+        self.is_header = is_header
+        self.content = content
+        self.text = text
+
+    def __repr__(self) -> str:
+        return (f"TableCell(row={self.row}, col={self.col}, rowspan={self.rowspan}, "
+                f"colspan={self.colspan}, text={self.text!r})")
+
+
+class TableGrid:
+    """
+    rowspan/colspan展开后的表格网格。
+    cells按(row, col)的行优先顺序存放；slots是长度为n_rows*n_cols的array，
+    slots[r*n_cols+c]为覆盖该位置的单元格在cells中的下标，-1表示空位。
+    由parse_table_html返回的对象会被缓存共享，请当作只读对象使用。
+    """
+    __slots__ = ("n_rows", "n_cols", "cells", "slots")
+
+    def __init__(self, n_rows: int, n_cols: int, cells: List[TableCell], slots: "array[int]"):
+        self.n_rows = n_rows
+        self.n_cols = n_cols
+        self.cells = cells
+        self.slots = slots
+
+    @classmethod
+    def from_cells(cls, cells: Sequence[TableCell]) -> "TableGrid":
+        """
+        由已确定位置的单元格构造网格，重叠的位置以先出现的单元格为准
+        """
+        n_rows = max((c.row + c.rowspan for c in cells), default=0)
+        n_cols = max((c.col + c.colspan for c in cells), default=0)
+        ordered = sorted(cells, key=lambda c: (c.row, c.col))
+        slots = array("i", [-1]) * (n_rows * n_cols)
+        kept: List[TableCell] = []
+        for cell in ordered:
+            base = cell.row * n_cols + cell.col
+            if slots[base] != -1:
+                continue
+            idx = len(kept)
+            kept.append(cell)
+            for r in range(cell.rowspan):
+                start = base + r * n_cols
+                for pos in range(start, start + cell.colspan):
+                    if slots[pos] == -1:
+                        slots[pos] = idx
+        return cls(n_rows, n_cols, kept, slots)
+
+    @classmethod
+    def from_texts(cls, rows: Sequence[Sequence[str]], header_rows: int = 0) -> "TableGrid":
+        """
+        由二维文本列表构造无合并单元格的网格
+        """
+        cells = []
+        for r, row in enumerate(rows):
+            for c, text in enumerate(row):
+                cells.append(TableCell(r, c, is_header=r < header_rows,
+                                       content=html.escape(text, quote=False), text=text))
+        return cls.from_cells(cells)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.n_rows, self.n_cols
+
+    def cell_at(self, row: int, col: int) -> Optional[TableCell]:
+        idx = self.slots[row * self.n_cols + col]
+        return self.cells[idx] if idx >= 0 else None
+
+    def text_at(self, row: int, col: int) -> str:
+        idx = self.slots[row * self.n_cols + col]
+        return self.cells[idx].text if idx >= 0 else ""
+
+    def row_texts(self, row: int) -> List[str]:
+        cells = self.cells
+        base = row * self.n_cols
+        return [cells[i].text if i >= 0 else "" for i in self.slots[base:base + self.n_cols]]
+
+    def texts(self) -> List[List[str]]:
+        """
+        返回展开后的二维文本，被合并单元格覆盖的位置重复该单元格的文本
+        """
+        return [self.row_texts(r) for r in range(self.n_rows)]
+
+    def iter_rows(self) -> Iterator[List[TableCell]]:
+        """
+        按行返回以该行为起点的单元格
+        """
+        cells = self.cells
+        i = 0
+        for r in range(self.n_rows):
+            row = []
+            while i < len(cells) and cells[i].row == r:
+                row.append(cells[i])
+                i += 1
+            yield row
+
+    def header_row_count(self) -> int:
+        """
+        表头行数：从第一行起连续的、全部由th构成的行数
+        """
+        count = 0
+        for row in self.iter_rows():
+            if not row or not all(c.is_header for c in row):
+                break
+            count += 1
+        return count
+
+    def to_html(self) -> str:
+        return grid_to_html(self)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __repr__(self) -> str:
+        return f"TableGrid(n_rows={self.n_rows}, n_cols={self.n_cols}, n_cells={len(self.cells)})"
+
+
+def _span(value: Optional[str]) -> int:
+    try:
+        span = int(str(value).strip())
+    except (TypeError, ValueError):
+        return 1
+    return min(max(span, 1), _MAX_SPAN)
+
+
+class _TableHTMLParser(HTMLParser):
+    """
+    只解析第一个<table>，嵌套表格的内容按单元格文本处理
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[List[Tuple[int, int, bool, str, str]]] = []
+        self._depth = 0          # table嵌套层数
+        self._done = False
+        self._cell = None        # [rowspan, colspan, is_header, content_parts, text_parts]
+
+    def handle_starttag(self, tag, attrs):
+        if self._done:
+            return
+        if tag == "table":
+            self._depth += 1
+            if self._depth == 1:
+                return
+        if self._depth == 0:
+            return
+        if self._depth == 1 and tag == "tr":
+            self._close_cell()
+            self.rows.append([])
+        elif self._depth == 1 and tag in _CELL_TAGS:
+            self._close_cell()
+            if not self.rows:
+                self.rows.append([])
+            attr = dict(attrs)
+            self._cell = [_span(attr.get("rowspan")), _span(attr.get("colspan")), tag == "th", [], []]
+        elif self._cell is not None:
+            self._cell[3].append(self.get_starttag_text() or f"<{tag}>")
+            if tag in _VOID_TAGS:
+                self._cell[4].append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self._done or self._depth == 0:
+            return
+        if tag == "table":
+            self._depth -= 1
+            if self._depth == 0:
+                self._close_cell()
+                self._done = True
+                return
+        if self._depth == 1 and tag in _CELL_TAGS + ("tr",):
+            self._close_cell()
+        elif self._cell is not None and tag not in _VOID_TAGS:
+            self._cell[3].append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell[3].append(html.escape(data, quote=False))
+            self._cell[4].append(data)
+
+    def _close_cell(self):
+        if self._cell is None:
+            return
+        rowspan, colspan, is_header, content, text = self._cell
+        self.rows[-1].append((rowspan, colspan, is_header,
+                              "".join(content).strip(),
+                              _WS_RE.sub(" ", "".join(text)).strip()))
+        self._cell = None
+
+
+@functools.lru_cache(maxsize=2048)
+def parse_table_html(table_html: str) -> TableGrid:
+    """
+    把HTML表格解析为TableGrid，按HTML表格布局规则放置rowspan/colspan单元格。
+    结果按输入字符串缓存，同一table_body被多处使用时只解析一次
+    """
+    parser = _TableHTMLParser()
+    parser.feed(table_html or "")
+    parser.close()
+
+    cells: List[TableCell] = []
+    occupied = set()
+    for r, row in enumerate(parser.rows):
+        c = 0
+        for rowspan, colspan, is_header, content, text in row:
+            while (r, c) in occupied:
+                c += 1
+            cells.append(TableCell(r, c, rowspan, colspan, is_header, content, text))
+            for dr in range(rowspan):
+                for dc in range(colspan):
+                    occupied.add((r + dr, c + dc))
+            c += colspan
+    grid = TableGrid.from_cells(cells)
+    # 末尾只由rowspan撑出来的行不计入表格
+    if grid.n_rows > len(parser.rows):
+        cells = [cell for cell in grid.cells]
+        for cell in cells:
+            cell.rowspan = min(cell.rowspan, len(parser.rows) - cell.row)
+        grid = TableGrid.from_cells(cells)
+    return grid
+
+
+def grid_to_html(grid: TableGrid) -> str:
+    """
+    把TableGrid序列化为规范化的HTML：只保留table/tr/td/th和必要的rowspan/colspan
+    """
+    parts = ["<table>"]
+    for row in grid.iter_rows():
+        parts.append("<tr>")
+        for cell in row:
+            tag = "th" if cell.is_header else "td"
+            attrs = ""
+            if cell.rowspan > 1:
+                attrs += f' rowspan="{cell.rowspan}"'
+            if cell.colspan > 1:
+                attrs += f' colspan="{cell.colspan}"'
+            parts.append(f"<{tag}{attrs}>{cell.content}</{tag}>")
+        parts.append("</tr>")
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def normalize_table_html(table_html: str) -> str:
+    """
+    解析后重新序列化，用于比较不同工具输出时消除属性、空白、thead/tbody等差异
+    """
+    return grid_to_html(parse_table_html(table_html))
@@ -0,0 +1,141 @@
+"""
+表格抽取结果的打分函数，输入均为HTML字符串（table_body），内部转换为TableGrid计算。
+- teds: Tree-Edit-Distance-based Similarity，table -> tr -> td/th 三层树上的树编辑距离
+        (Zhang-Shasha算法)，单元格节点的替换代价为内容的归一化编辑距离
+- cell_f1: 单元格级别的precision/recall/F1，按单元格文本的多重集合计算，不受行列错位影响
+"""
+from collections import Counter
+from typing import Dict, List, Tuple
+from .table_grid import TableGrid, parse_table_html
+
+try:
+    from rapidfuzz.distance import Levenshtein as _Levenshtein
+except ImportError:  # rapidfuzz是可选依赖
+    _Levenshtein = None
+
+
+def normalized_edit_distance(a: str, b: str) -> float:
+    """
+    归一化编辑距离，取值[0, 1]
+    """
+    if a == b:
+        return 0.0
+    if not a or not b:
+        return 1.0
+    if _Levenshtein is not None:
+        return _Levenshtein.normalized_distance(a, b)
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1] / max(len(a), len(b))
+
+
+def _table_tree(grid: TableGrid, structure_only: bool) -> Tuple[List[tuple], List[int]]:
+    """
+    把网格转换为后序遍历的节点列表与每个节点的最左叶子下标
+    节点标签：("table",) / ("tr",) / (tag, rowspan, colspan, text)
+    """
+    labels: List[tuple] = []
+    leftmost: List[int] = []
+    for row in grid.iter_rows():
+        start = len(labels)
+        for cell in row:
+            leftmost.append(len(labels))
+            labels.append(("th" if cell.is_header else "td", cell.rowspan, cell.colspan,
+                           "" if structure_only else cell.text))
+        leftmost.append(start)
+        labels.append(("tr",))
+    leftmost.append(0)
+    labels.append(("table",))
+    return labels, leftmost
+
+
+def _rename_cost(a: tuple, b: tuple) -> float:
+    if a[0] != b[0]:
+        return 1.0
+    if len(a) == 1:
+        return 0.0
+    if a[1:3] != b[1:3]:
+        return 1.0
+    return normalized_edit_distance(a[3], b[3])
+
+
+def _keyroots(leftmost: List[int]) -> List[int]:
+    seen = {}
+    for i, l in enumerate(leftmost):
+        seen[l] = i
+    return sorted(seen.values())
+
+
+def tree_edit_distance(labels1, leftmost1, labels2, leftmost2) -> float:
+    """
+    Zhang-Shasha树编辑距离，插入、删除代价为1
+    """
+    n, m = len(labels1), len(labels2)
+    td = [[0.0] * m for _ in range(n)]
+    for i in _keyroots(leftmost1):
+        li = leftmost1[i]
+        for j in _keyroots(leftmost2):
+            lj = leftmost2[j]
+            rows, cols = i - li + 2, j - lj + 2
+            fd = [[0.0] * cols for _ in range(rows)]
+            for x in range(1, rows):
+                fd[x][0] = fd[x - 1][0] + 1
+            for y in range(1, cols):
+                fd[0][y] = fd[0][y - 1] + 1
+            for x in range(1, rows):
+                i1 = li + x - 1
+                for y in range(1, cols):
+                    j1 = lj + y - 1
+                    if leftmost1[i1] == li and leftmost2[j1] == lj:
+                        fd[x][y] = min(fd[x - 1][y] + 1,
+                                       fd[x][y - 1] + 1,
+                                       fd[x - 1][y - 1] + _rename_cost(labels1[i1], labels2[j1]))
+                        td[i1][j1] = fd[x][y]
+                    else:
+                        p = leftmost1[i1] - li
+                        q = leftmost2[j1] - lj
+                        fd[x][y] = min(fd[x - 1][y] + 1,
+                                       fd[x][y - 1] + 1,
+                                       fd[p][q] + td[i1][j1])
+    return td[n - 1][m - 1]
+
+
+def teds(pred_html: str, gt_html: str, structure_only: bool = False) -> float:
+    """
+    计算预测表格与真值表格的TEDS，取值[0, 1]，越大越好
+    structure_only=True时忽略单元格内容，即TEDS-S
+    """
+    pred = parse_table_html(pred_html or "")
+    gt = parse_table_html(gt_html or "")
+    if len(pred) == 0 and len(gt) == 0:
+        return 1.0
+    if len(pred) == 0 or len(gt) == 0:
+        return 0.0
+    labels1, leftmost1 = _table_tree(pred, structure_only)
+    labels2, leftmost2 = _table_tree(gt, structure_only)
+    distance = tree_edit_distance(labels1, leftmost1, labels2, leftmost2)
+    return max(0.0, 1.0 - distance / max(len(labels1), len(labels2)))
+
+
+def _cell_counter(grid: TableGrid) -> Counter:
+    return Counter(" ".join(cell.text.lower().split()) for cell in grid.cells if cell.text)
+
+
+def cell_f1(pred_html: str, gt_html: str) -> Dict[str, float]:
+    """
+    单元格级别的precision/recall/f1，空单元格不计入
+    """
+    pred = _cell_counter(parse_table_html(pred_html or ""))
+    gt = _cell_counter(parse_table_html(gt_html or ""))
+    n_pred, n_gt = sum(pred.values()), sum(gt.values())
+    if n_pred == 0 and n_gt == 0:
+        return {"precision": 1.0, "recall": 1.0, "f1": 1.0}
+    hit = sum((pred & gt).values())
+    precision = hit / n_pred if n_pred else 0.0
+    recall = hit / n_gt if n_gt else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if hit else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
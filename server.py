@@ -0,0 +1,307 @@
+"""
+表格抽取的本地HTTP服务。
+抽取工具与模型在常驻的worker进程中只加载一次，其它服务通过HTTP调用，无需各自导入整套工具链。
+    python server.py --port 8000 --workers 2
+
+接口（pdf_path为服务所在机器上的路径）：
+    POST /extract  {"pdf_path": ..., "stitch": false}                 -> 对齐后的候选表格组
+    POST /combine  {"tables": [...], "pdf_path": ..., "vlm": false}   -> 一组候选表格的融合结果
+    POST /fuse     {"pdf_path": ..., "vlm": false, "stitch": false}   -> 抽取+融合，每个表格完成后
+                                                                         立即以一行JSON(NDJSON)返回；
+                                                                         失败的表格返回{"table_idx", "error"}，
+                                                                         最后一行为{"done": true, "failed": n}
+    GET  /health, GET /metrics
+同时处理的请求数超过max_inflight时排队，排队数超过max_queue时返回503。
+提交到worker进程池的任务数（包括/fuse中逐个表格的融合）不超过worker数，其余在服务端排队，
+因此一个大文档的/fuse不会把几百个任务一次性塞进进程池，/combine也不必排在它们全部之后。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+
+# ---------------- worker进程 ----------------
+_agent = None
+_croppers: "OrderedDict[str, Any]" = OrderedDict()
+
+
+def _build_model():
+    from camel.models import ModelFactory
+    from camel.types import ModelType, ModelPlatformType
+    return ModelFactory.create(
+        model_platform=ModelPlatformType(os.environ.get("PDF_AGENT_MODEL_PLATFORM", ModelPlatformType.DEEPSEEK.value)),
+        model_type=os.environ.get("PDF_AGENT_MODEL_TYPE", ModelType.DEEPSEEK_CHAT.value),
+        model_config_dict={"temperature": 0.0},
+    )
+
+
+def _init_worker():
+    """
+    worker进程启动时导入工具链、加载各工具的模型并创建agent，之后的请求直接复用
+    marker、docling、MinerU的模型都是首次使用时才加载的单例，这里主动触发一次
+    """
+    global _agent
+    from combine_table_agent import TableOptimizationAgent
+    from pdf_toolkit import marker_function, docling_function, mineru_function
+    marker_function._model_dict()
+    docling_function._document_converter()
+    mineru_function._warm_up()
+    _agent = TableOptimizationAgent(model=_build_model())
+
+
+def _combined_tool(stitch: bool):
+    from pdf_toolkit import marker_extractor, mineru_extractor, docling_extractor, combinedTool
+    return combinedTool(marker_extractor, mineru_extractor, docling_extractor, stitch=stitch)
+
+
+def _cropper(pdf_path: str):
+    from my_utils import PDFCropper
+    if pdf_path not in _croppers:
+        _croppers[pdf_path] = PDFCropper(pdf_path)
+        while len(_croppers) > 4:
+            _croppers.popitem(last=False)[1].close()
+    _croppers.move_to_end(pdf_path)
+    return _croppers[pdf_path]
+
+
+def _worker_extract(pdf_path: str, stitch: bool) -> List[List[Optional[Dict[str, Any]]]]:
+    return _combined_tool(stitch)(pdf_path)
+
+
+def _worker_combine(tables: List[Optional[Dict[str, Any]]], pdf_path: Optional[str], vlm: bool):
+    table_img = None
+    if vlm:
+        from pdf_toolkit.stitch_function import crop_parts
+        rep_table = next(t for t in tables if t is not None)
+        table_img = _cropper(pdf_path).crop_parts_payload(crop_parts(rep_table))
+    return _agent.combine_tables(tables, table_img)
+
+
+def _worker_ping() -> int:
+    # 占用worker一小段时间，使预热的ping分散到不同的worker上
+    time.sleep(0.1)
+    return os.getpid()
+
+
+# ---------------- 服务 ----------------
+class ExtractRequest(BaseModel):
+    pdf_path: str
+    stitch: bool = False
+
+
+class CombineRequest(BaseModel):
+    tables: List[Optional[Dict[str, Any]]]
+    pdf_path: Optional[str] = None
+    vlm: bool = False
+
+
+class FuseRequest(BaseModel):
+    pdf_path: str
+    vlm: bool = False
+    stitch: bool = False
+
+
+class _Admission:
+    """
+    并发与排队控制：最多max_inflight个请求同时执行，排队超过max_queue时拒绝
+    """
+    def __init__(self, max_inflight: int, max_queue: int):
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.max_queue = max_queue
+        self.waiting = 0
+        self.inflight = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            metrics["rejected"] += 1
+            raise HTTPException(status_code=503, detail="server busy", headers={"Retry-After": "5"})
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self.semaphore.release()
+
+
+metrics: Dict[str, Any] = defaultdict(int)
+latency: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+
+
+def create_app(workers: int = 2, max_inflight: int = 8, max_queue: int = 32) -> FastAPI:
+    state: Dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # spawn避免fork带来的torch/cuda状态问题
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        # 预热：直到每个worker都完成初始化并响应过ping，先初始化完的worker可能接走全部ping，因此按pid计数
+        ready = set()
+        while len(ready) < workers:
+            ready.update(await asyncio.gather(*[loop.run_in_executor(executor, _worker_ping) for _ in range(workers)]))
+        state["executor"] = executor
+        state["pool_slots"] = asyncio.Semaphore(workers)
+        state["admission"] = _Admission(max_inflight, max_queue)
+        state["started"] = time.time()
+        yield
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="pdf_extract_agent", lifespan=lifespan)
+
+    async def run(func, *args):
+        """
+        在进程池中执行，同时提交的任务数不超过worker数；名额在进程池中的任务真正结束时才归还，
+        调用方被取消（客户端断开）时尚未开始的任务一并取消
+        """
+        loop = asyncio.get_running_loop()
+        slots = state["pool_slots"]
+        await slots.acquire()
+        try:
+            future = state["executor"].submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(slots.release))
+        return await asyncio.wrap_future(future)
+
+    def record(endpoint: str, start: float):
+        latency[endpoint]["count"] += 1
+        latency[endpoint]["seconds"] += time.perf_counter() - start
+
+    @app.post("/extract")
+    async def extract(req: ExtractRequest):
+        async with state["admission"].slot():
+            start = time.perf_counter()
+            metrics["requests"] += 1
+            groups = await run(_worker_extract, req.pdf_path, req.stitch)
+            record("extract", start)
+            return {"groups": groups}
+
+    @app.post("/combine")
+    async def combine(req: CombineRequest):
+        if req.vlm and not req.pdf_path:
+            raise HTTPException(status_code=422, detail="pdf_path is required when vlm is true")
+        async with state["admission"].slot():
+            start = time.perf_counter()
+            metrics["requests"] += 1
+            content, table = await run(_worker_combine, req.tables, req.pdf_path, req.vlm)
+            record("combine", start)
+            return {"content": content, "table": table}
+
+    @app.post("/fuse")
+    async def fuse(req: FuseRequest):
+        slot = state["admission"].slot()
+        await slot.__aenter__()
+        metrics["requests"] += 1
+        start = time.perf_counter()
+        released = False
+
+        async def release():
+            nonlocal released
+            if not released:
+                released = True
+                record("fuse", start)
+                await slot.__aexit__(None, None, None)
+
+        # 先完成抽取再开始流式返回，抽取失败时可以返回正常的错误状态码
+        try:
+            groups = await run(_worker_extract, req.pdf_path, req.stitch)
+        except Exception as e:
+            metrics["errors"] += 1
+            await release()
+            raise HTTPException(status_code=500, detail=f"extraction failed: {type(e).__name__}: {e}")
+        except BaseException:
+            await release()
+            raise
+
+        async def combine_one(table_idx, tables):
+            # 单个表格失败（模型出错、worker崩溃等）时返回错误记录，其余表格继续
+            try:
+                content, table = await run(_worker_combine, tables, req.pdf_path, req.vlm)
+            except Exception as e:
+                return {"table_idx": table_idx, "error": f"{type(e).__name__}: {e}"}
+            return {"table_idx": table_idx, "content": content, "table": table}
+
+        async def stream():
+            pending = set()
+            failed = 0
+            try:
+                next_idx = 0
+                while next_idx < len(groups) or pending:
+                    # 每个请求最多同时等待workers个表格，其余表格在这里排队
+                    while next_idx < len(groups) and len(pending) < workers:
+                        pending.add(asyncio.ensure_future(combine_one(next_idx, groups[next_idx])))
+                        next_idx += 1
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    # 按完成顺序返回，table_idx为该表格在文档中的序号
+                    for finished in done:
+                        result = finished.result()
+                        if "error" in result:
+                            failed += 1
+                            metrics["table_errors"] += 1
+                        else:
+                            metrics["tables"] += 1
+                        yield json.dumps(result, ensure_ascii=False) + "\n"
+                yield json.dumps({"done": True, "tables": len(groups), "failed": failed}) + "\n"
+            except Exception as e:
+                # 响应头已经发出，只能以一条错误记录结束数据流
+                metrics["errors"] += 1
+                yield json.dumps({"done": False, "error": f"{type(e).__name__}: {e}"}, ensure_ascii=False) + "\n"
+            finally:
+                # 客户端中途断开时不再等待剩余的表格
+                for task in pending:
+                    task.cancel()
+                await release()
+
+        # 生成器未被迭代（客户端提前断开）时由background释放
+        return StreamingResponse(stream(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok" if "executor" in state else "starting", "workers": workers}
+
+    @app.get("/metrics")
+    async def get_metrics():
+        admission = state.get("admission")
+        return {
+            "uptime_seconds": time.time() - state.get("started", time.time()),
+            "workers": workers,
+            "inflight": admission.inflight if admission else 0,
+            "queued": admission.waiting if admission else 0,
+            "counters": dict(metrics),
+            "latency": {
+                name: {"count": v["count"], "mean_seconds": v["seconds"] / v["count"] if v["count"] else 0.0}
+                for name, v in latency.items()
+            },
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="表格抽取HTTP服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="常驻worker进程数")
+    parser.add_argument("--max_inflight", type=int, default=8, help="同时执行的请求数")
+    parser.add_argument("--max_queue", type=int, default=32, help="排队请求数上限，超过时返回503")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.workers, args.max_inflight, args.max_queue), host=args.host, port=args.port)
@@ -0,0 +1,50 @@
+import json
+import pytest
+
+
+class FakeModel:
+    """
+    模型后端的替身：按顺序返回replies中的回复（可以是字符串、异常或可调用对象），记录收到的消息
+    """
+    model_type = "fake-model"
+
+    def __init__(self, replies=None, tokens=100):
+        self.replies = list(replies or [])
+        self.tokens = tokens
+        self.messages = []
+
+    @property
+    def calls(self):
+        return len(self.messages)
+
+    def run(self, messages):
+        from camel.types import ChatCompletion
+        self.messages.append(messages)
+        reply = self.replies.pop(0) if self.replies else answer({"table_body": "<table></table>"})
+        if callable(reply):
+            reply = reply(messages)
+        if isinstance(reply, BaseException):
+            raise reply
+        return ChatCompletion(
+            id="fake", created=0, model=self.model_type, object="chat.completion",
+            choices=[{"index": 0, "finish_reason": "stop", "logprobs": None,
+                      "message": {"role": "assistant", "content": reply}}],
+            usage={"prompt_tokens": self.tokens - 10, "completion_tokens": 10, "total_tokens": self.tokens},
+        )
+
+
+def answer(table):
+    """
+    combine_tables能解析的回复
+    """
+    return "Comparison: ok\nFinal answer:\n```json\n" + json.dumps(table) + "\n```"
+
+
+def candidate(body, page_idx="0", bbox=(10, 10, 200, 100), caption=""):
+    return {"table_body": body, "table_caption": caption, "table_footnote": "",
+            "page_idx": page_idx, "bbox": list(bbox)}
+
+
+@pytest.fixture
+def fake_model():
+    return FakeModel
@@ -0,0 +1,77 @@
+import os
+from pdf_toolkit.cache_decorator import LRUCache, TieredToolCache, cache_to_folder
+
+
+def test_lru_eviction_and_stats():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)   # a变为最近使用
+    cache.put("c", 3)                    # 淘汰b
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_lru_disabled():
+    cache = LRUCache(0)
+    cache.put("a", 1)
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def _tables():
+    return [{"table_body": "<table><tr><td>1</td></tr></table>", "bbox": [0, 0, 1, 1], "page_idx": "0"}]
+
+
+def test_tiered_read_through(tmp_path):
+    tool_dir = str(tmp_path / "tool")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _tables()
+
+    cache = TieredToolCache(8)
+    assert cache.get(tool_dir, "/data/doc.pdf") is None
+    assert cache.get(tool_dir, "/data/doc.pdf", compute) == _tables()
+    assert len(calls) == 1
+    assert os.listdir(os.path.join(tool_dir, "doc")) == ["1.json"]
+
+    # 内存命中
+    assert cache.get(tool_dir, "/data/doc.pdf", compute) == _tables()
+    assert cache.stats()["memory"]["hits"] == 1
+
+    # 新的进程（空的内存层）从磁盘读取
+    fresh = TieredToolCache(8)
+    assert fresh.get(tool_dir, "/other/doc.pdf", compute) == _tables()
+    assert len(calls) == 1
+    assert fresh.stats()["disk"] == {"hits": 1, "misses": 0, "writes": 0}
+    assert cache.stats()["disk"] == {"hits": 0, "misses": 2, "writes": 1}
+
+
+def test_tiered_results_are_isolated_copies(tmp_path):
+    tool_dir = str(tmp_path / "tool")
+    cache = TieredToolCache(8)
+    source = _tables()
+    first = cache.get(tool_dir, "doc.pdf", lambda: source)
+    source[0]["table_body"] = "changed"
+    first[0].pop("bbox")
+    second = cache.get(tool_dir, "doc.pdf")
+    assert second == _tables()
+    second[0]["page_idx"] = "9"
+    assert cache.get(tool_dir, "doc.pdf") == _tables()
+
+
+def test_cache_to_folder_decorator(tmp_path):
+    calls = []
+
+    @cache_to_folder("fake", str(tmp_path))
+    def tool(pdf_path):
+        calls.append(pdf_path)
+        return _tables()
+
+    assert tool("unique_doc_for_decorator.pdf") == _tables()
+    assert tool("unique_doc_for_decorator.pdf") == _tables()
+    assert calls == ["unique_doc_for_decorator.pdf"]
@@ -0,0 +1,98 @@
+import copy
+import os
+import pytest
+from combine_table_agent import TableOptimizationAgent
+from my_utils import FusionCheckpoint
+from tests.conftest import FakeModel, answer, candidate
+
+
+def _groups():
+    return [
+        [candidate(f"<table><tr><td>{i}</td></tr></table>", page_idx=str(i)), None,
+         candidate(f"<table><tr><td>{i}!</td></tr></table>", page_idx=str(i))]
+        for i in range(3)
+    ]
+
+
+def _fused(i):
+    return {"table_body": f"<table><tr><td>{i}</td></tr></table>", "page_idx": str(i)}
+
+
+def _extract(agent, groups, state_dir):
+    return agent.extract_with_combined_tables("/data/doc.pdf", lambda pdf_path: groups, checkpoint_dir=state_dir)
+
+
+def test_resume_skips_finished_tables(tmp_path):
+    groups = _groups()
+    before = copy.deepcopy(groups)
+
+    model = FakeModel([answer(_fused(0)), ConnectionError("api down")])
+    with pytest.raises(ConnectionError):
+        _extract(TableOptimizationAgent(model=model), groups, str(tmp_path))
+    assert model.calls == 2
+
+    model = FakeModel([answer(_fused(1)), answer(_fused(2))])
+    content_list, table_list = _extract(TableOptimizationAgent(model=model), groups, str(tmp_path))
+    assert model.calls == 2
+    assert table_list == [_fused(0), _fused(1), _fused(2)]
+    # 出错重试前后候选表格保持不变（bbox等没有被pop）
+    assert groups == before
+
+    model = FakeModel()
+    assert _extract(TableOptimizationAgent(model=model), groups, str(tmp_path))[1] == table_list
+    assert model.calls == 0
+
+
+@pytest.mark.parametrize("reply", [
+    "Comparison: the reply was cut off before the fin",
+    "Final answer:\n```json\n{\"table_body\": \"<table><tr><td>0",
+])
+def test_unparsable_reply_is_retried_on_resume(tmp_path, reply):
+    model = FakeModel([reply, answer(_fused(1)), answer(_fused(2))])
+    content_list, table_list = _extract(TableOptimizationAgent(model=model), _groups(), str(tmp_path))
+    assert table_list[0] == {}
+    assert content_list[0] == reply
+
+    model = FakeModel([answer(_fused(0))])
+    table_list = _extract(TableOptimizationAgent(model=model), _groups(), str(tmp_path))[1]
+    assert model.calls == 1
+    assert table_list == [_fused(0), _fused(1), _fused(2)]
+
+
+def test_changed_candidates_or_prompt_invalidate_records(tmp_path):
+    model = FakeModel([answer(_fused(i)) for i in range(3)])
+    _extract(TableOptimizationAgent(model=model), _groups(), str(tmp_path))
+
+    groups = _groups()
+    groups[1][0]["table_body"] = "<table><tr><td>changed</td></tr></table>"
+    model = FakeModel([answer(_fused(1))])
+    _extract(TableOptimizationAgent(model=model), groups, str(tmp_path))
+    assert model.calls == 1
+
+    agent = TableOptimizationAgent(model=FakeModel([answer(_fused(i)) for i in range(3)]))
+    agent.combine_tables_prompt += "\nBe careful."
+    _extract(agent, _groups(), str(tmp_path))
+    assert agent.model_backend.calls == 3
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    checkpoint = FusionCheckpoint(str(tmp_path), "/data/doc.pdf", "combined", "prompt")
+    checkpoint.put(0, _groups()[0], None, "c0", _fused(0))
+    with open(checkpoint.path, "ab") as f:
+        f.write(b'{"table_idx": 1, "key": "abc", "candid')
+
+    resumed = FusionCheckpoint(str(tmp_path), "/data/doc.pdf", "combined", "prompt")
+    assert set(resumed.records) == {0}
+    assert resumed.get(0, _groups()[0]) == ("c0", _fused(0))
+    resumed.put(1, _groups()[1], None, "c1", _fused(1))
+
+    reloaded = FusionCheckpoint(str(tmp_path), "/data/doc.pdf", "combined", "prompt")
+    assert reloaded.get(1, _groups()[1]) == ("c1", _fused(1))
+    with open(reloaded.path, "rb") as f:
+        assert len(f.read().splitlines()) == 2
+
+
+def test_checkpoint_files_are_per_method(tmp_path):
+    FusionCheckpoint(str(tmp_path), "/data/doc.pdf", "combined").put(0, [], None, "c", _fused(0))
+    assert FusionCheckpoint(str(tmp_path), "/data/doc.pdf", "combined_vlm").get(0, []) is None
+    assert os.listdir(str(tmp_path)) == ["doc.combined.ckpt.jsonl"]
@@ -0,0 +1,92 @@
+import copy
+from pdf_toolkit.dedup_index import FusionDedupIndex, group_fingerprint
+from tests.conftest import FakeModel, answer, candidate
+
+BODY = "<table><tr><th>a</th></tr><tr><td>1</td></tr></table>"
+
+
+def _group(**kwargs):
+    return [candidate(BODY, **kwargs), None, candidate(BODY.replace("1", "2"), **kwargs)]
+
+
+def test_fingerprint_ignores_position():
+    assert group_fingerprint(_group(), "m") == group_fingerprint(_group(page_idx="7", bbox=(0, 0, 5, 5)), "m")
+    # 规范化后相同的HTML得到相同的指纹
+    messy = _group()
+    messy[0]["table_body"] = '<table border="1"><tr><th> a </th></tr><tbody><tr><td>1</td></tr></tbody></table>'
+    assert group_fingerprint(messy, "m") == group_fingerprint(_group(), "m")
+
+
+def test_fingerprint_changes_with_mode_image_and_content():
+    base = group_fingerprint(_group(), "combine:prompt1:model1")
+    assert group_fingerprint(_group(), "combine:prompt2:model1") != base
+    assert group_fingerprint(_group(), "combine:prompt1:model2") != base
+    assert group_fingerprint(_group(), "combine:prompt1:model1", "imagehash") != base
+    assert group_fingerprint(_group(caption="Table 1"), "combine:prompt1:model1") != base
+    swapped = _group()
+    swapped[1], swapped[2] = swapped[2], swapped[1]
+    assert group_fingerprint(swapped, "combine:prompt1:model1") != base
+
+
+def test_index_round_trip(tmp_path):
+    index = FusionDedupIndex(str(tmp_path))
+    table = {"table_body": BODY, "page_idx": "0"}
+    assert index.get("ab" * 32) is None
+    index.put("ab" * 32, "content", table)
+    table["table_body"] = "changed"
+
+    content, stored = index.get("ab" * 32)
+    assert (content, stored["table_body"]) == ("content", BODY)
+    stored["table_body"] = "changed again"
+    assert index.get("ab" * 32)[1]["table_body"] == BODY
+
+    # 另一个任务（新的索引对象）从磁盘读取
+    fresh = FusionDedupIndex(str(tmp_path))
+    assert fresh.get("ab" * 32) == ("content", {"table_body": BODY, "page_idx": "0"})
+    assert index.stats() == {"hits": 2, "misses": 1}
+
+
+def test_combine_tables_skips_model_on_hit(tmp_path):
+    from combine_table_agent import TableOptimizationAgent
+    fused = {"table_body": BODY, "table_caption": "", "table_footnote": "", "page_idx": "0"}
+    model = FakeModel([answer(fused)])
+    agent = TableOptimizationAgent(model=model, dedup_index=FusionDedupIndex(str(tmp_path)))
+
+    content, table = agent.combine_tables(_group(), None)
+    assert table == fused and model.calls == 1
+
+    # 另一个文档中位置不同的同一组候选表格，直接复用结果，page_idx取当前候选的值
+    content2, table2 = agent.combine_tables(_group(page_idx="5", bbox=(1, 2, 3, 4)), None)
+    assert model.calls == 1
+    assert content2 == content
+    assert table2 == dict(fused, page_idx="5")
+
+
+def test_dedup_key_changes_with_prompt_and_model(tmp_path):
+    from combine_table_agent import TableOptimizationAgent
+    index = FusionDedupIndex(str(tmp_path))
+    fused = {"table_body": BODY, "page_idx": "0"}
+    model = FakeModel([answer(fused)] * 3)
+    agent = TableOptimizationAgent(model=model, dedup_index=index)
+    agent.combine_tables(_group(), None)
+
+    agent.combine_tables_prompt += "\nBe careful."
+    agent.combine_tables(_group(), None)
+    assert model.calls == 2
+
+    other_model = FakeModel([answer(fused)])
+    other_model.model_type = "another-model"
+    TableOptimizationAgent(model=other_model, dedup_index=index).combine_tables(_group(), None)
+    assert other_model.calls == 1
+
+
+def test_empty_answer_is_not_indexed(tmp_path):
+    from combine_table_agent import TableOptimizationAgent
+    model = FakeModel(["Final answer:\nnot json at all", answer({"table_body": BODY})])
+    agent = TableOptimizationAgent(model=model, dedup_index=FusionDedupIndex(str(tmp_path)))
+    group = _group()
+    before = copy.deepcopy(group)
+    assert agent.combine_tables(group, None)[1] == {}
+    assert agent.combine_tables(group, None)[1] == {"table_body": BODY}
+    assert model.calls == 2
+    assert group == before
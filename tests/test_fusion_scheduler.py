@@ -0,0 +1,79 @@
+import pytest
+from combine_table_agent import TableOptimizationAgent
+from fusion_scheduler import FusionScheduler, consensus_table
+from pdf_toolkit.dedup_index import FusionDedupIndex
+from my_utils import StreamingResultWriter, load_agent_output
+from tests.conftest import FakeModel, answer, candidate
+
+
+def _groups(n=4):
+    return [
+        [candidate(f"<table><tr><td>{i}</td><td>x</td></tr></table>", page_idx=str(i)),
+         candidate(f"<table><tr><td>{i}</td><td>y</td></tr></table>", page_idx=str(i)),
+         None]
+        for i in range(n)
+    ]
+
+
+def _fused(i):
+    return {"table_body": f"<table><tr><td>{i}</td><td>x</td></tr></table>", "page_idx": str(i)}
+
+
+def _reply(messages):
+    # 按提示词中的候选表格返回对应的融合结果
+    text = messages[0]["content"] if isinstance(messages[0]["content"], str) else messages[0]["content"][0]["text"]
+    i = next(i for i in range(10) if f"<td>{i}</td>" in text)
+    return answer(_fused(i))
+
+
+def test_prompt_is_shared_with_agent():
+    agent = TableOptimizationAgent(model=FakeModel())
+    group = _groups(1)[0]
+    prompt = agent.build_combine_prompt(group, vlm=False)
+    assert "bbox" not in prompt and "None" in prompt
+    assert prompt != agent.build_combine_prompt(group, vlm=True)
+
+
+def test_token_ratio_is_learned_from_usage():
+    agent = TableOptimizationAgent(model=FakeModel())
+    scheduler = FusionScheduler(agent)
+    est = max(scheduler.estimate_tokens(g) for g in _groups())
+    # 实际用量是预估值的3倍：只按静态预估时第二次调用就会超出预算
+    agent.model_backend = FakeModel([_reply] * 4, tokens=3 * est)
+    scheduler = FusionScheduler(agent, token_budget=5 * est)
+    content_list, table_list, report = scheduler.run(_groups())
+    assert report["tokens_used"] <= 5 * est
+    assert agent.model_backend.calls == 1
+    assert report["fused"] == 1
+    assert {d["reason"] for d in report["degraded"]} == {"token_budget"}
+    assert report["token_ratio"] == pytest.approx(3.0, rel=0.01)
+
+
+def test_errors_and_empty_answers_degrade_and_continue(tmp_path):
+    model = FakeModel([_reply, TimeoutError("slow"), "no marker, cut off", _reply])
+    scheduler = FusionScheduler(TableOptimizationAgent(model=model))
+    groups = _groups()
+    with StreamingResultWriter(str(tmp_path), "doc") as writer:
+        content_list, table_list, report = scheduler.run(groups, writer=writer)
+    assert model.calls == 4
+    assert report["fused"] == 2
+    reasons = sorted(d["reason"] for d in report["degraded"])
+    assert reasons == ["empty_answer", "error: TimeoutError: slow"]
+    for d in report["degraded"]:
+        assert table_list[d["table_idx"]] == consensus_table(groups[d["table_idx"]])[0]
+    # 每个表格都已写出，读回时按table_idx排序
+    assert load_agent_output(str(tmp_path), "doc") == (content_list, table_list)
+
+
+def test_dedup_hits_are_not_charged(tmp_path):
+    agent = TableOptimizationAgent(model=FakeModel([_reply] * 4, tokens=1000),
+                                   dedup_index=FusionDedupIndex(str(tmp_path)))
+    FusionScheduler(agent).run(_groups())
+    assert agent.model_backend.calls == 4
+
+    scheduler = FusionScheduler(agent)
+    content_list, table_list, report = scheduler.run(_groups())
+    assert agent.model_backend.calls == 4
+    assert report["tokens_used"] == 0
+    assert report["fused"] == 4
+    assert scheduler.seconds_per_1k_tokens == 5.0
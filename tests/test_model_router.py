@@ -0,0 +1,105 @@
+import time
+import pytest
+from model_router import ModelRouter
+
+TEXT = [{"role": "user", "content": "hi"}]
+IMAGE = [{"role": "user", "content": [
+    {"type": "text", "text": "hi"},
+    {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}},
+]}]
+
+
+class FakeBackend:
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def run(self, messages):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.name
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(*args, **kwargs):
+        kwargs.setdefault("explore", 0.0)
+        kwargs.setdefault("hedge_percentile", None)
+        router = ModelRouter(*args, **kwargs)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def test_failover_to_healthy_backend(make_router):
+    bad = FakeBackend("bad", error=ConnectionError("down"))
+    good = FakeBackend("good")
+    router = make_router({"bad": bad, "good": good}, cooldown=0.0)
+    assert [router.run(TEXT) for _ in range(10)] == ["good"] * 10
+    # 只出过错的后端不会一直被优先选择
+    assert bad.calls <= 2
+    pools = router.stats()["pools"]["text"]
+    assert {s["name"]: s["errors"] for s in pools} == {"bad": bad.calls, "good": 0}
+
+
+def test_all_backends_fail_reraises_last_error(make_router):
+    a = FakeBackend("a", error=ValueError("a failed"))
+    b = FakeBackend("b", error=ValueError("b failed"))
+    router = make_router({"a": a, "b": b})
+    with pytest.raises(ValueError, match="failed"):
+        router.run(TEXT)
+    assert a.calls == 1 and b.calls == 1
+
+
+def test_text_and_image_pools(make_router):
+    text = FakeBackend("text")
+    vision = FakeBackend("vision")
+    router = make_router([text], [vision])
+    assert router.run(TEXT) == "text"
+    assert router.run(IMAGE) == "vision"
+    assert (text.calls, vision.calls) == (1, 1)
+
+    text_only = make_router([FakeBackend("text")])
+    assert text_only.run(IMAGE) == "text"
+
+
+def test_hedge_after_min_samples(make_router):
+    primary = FakeBackend("primary", delay=0.01)
+    secondary = FakeBackend("secondary", delay=0.2)
+    router = make_router({"primary": primary, "secondary": secondary},
+                         hedge_percentile=0.9, hedge_min_samples=5)
+    for _ in range(12):
+        router.run(TEXT)
+    assert primary.calls >= 5
+    hedged = router.stats()["hedged_requests"]
+
+    primary.delay = 2.0
+    start = time.monotonic()
+    assert router.run(TEXT) == "secondary"
+    assert time.monotonic() - start < 1.0
+    assert router.stats()["hedged_requests"] == hedged + 1
+
+
+def test_no_hedge_before_min_samples(make_router):
+    slow = FakeBackend("slow", delay=0.05)
+    router = make_router([slow], hedge_percentile=0.5, hedge_min_samples=50)
+    for _ in range(3):
+        assert router.run(TEXT) == "slow"
+    assert router.stats()["hedged_requests"] == 0
+
+
+def test_model_type_lists_pool_models(make_router):
+    class Model:
+        model_type = "deepseek-chat"
+
+    router = make_router([Model()])
+    assert router.model_type == "router(text=deepseek-chat;vision=deepseek-chat)"
@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+import pytest
+from my_utils import StreamingResultWriter, load_agent_output
+
+
+def _table(i):
+    return {"table_body": f"<table><tr><td>{i}</td></tr></table>", "page_idx": i}
+
+
+def test_round_trip_sorted_by_table_idx(tmp_path):
+    with StreamingResultWriter(str(tmp_path), "doc") as writer:
+        for i in (2, 0, 1):
+            writer.write(i, f"content {i}", _table(i))
+    content_list, table_list = load_agent_output(str(tmp_path), "doc")
+    assert content_list == ["content 0", "content 1", "content 2"]
+    assert table_list == [_table(0), _table(1), _table(2)]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    with StreamingResultWriter(str(tmp_path), "doc") as writer:
+        writer.write(0, "a", _table(0))
+        writer.write(1, "b", _table(1))
+    with open(os.path.join(str(tmp_path), "doc.jsonl"), "ab") as f:
+        f.write(b'{"table_idx": 2, "table": {"table_bo')
+    content_list, table_list = load_agent_output(str(tmp_path), "doc")
+    assert content_list == ["a", "b"]
+    assert table_list == [_table(0), _table(1)]
+
+
+def test_unclosed_gzip_stream_is_readable(tmp_path):
+    # 模拟进程崩溃：写入并fsync后不调用close，gzip流没有结尾
+    writer = StreamingResultWriter(str(tmp_path), "doc", compress=True, fsync_every=1)
+    writer.write(0, "a", _table(0))
+    writer.write(1, "b", _table(1))
+    assert not os.path.exists(writer.index_path)
+    content_list, table_list = load_agent_output(str(tmp_path), "doc")
+    assert content_list == ["a", "b"]
+    assert table_list == [_table(0), _table(1)]
+    writer.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_index_offsets_point_at_records(tmp_path, compress):
+    with StreamingResultWriter(str(tmp_path), "doc", compress=compress) as writer:
+        for i in range(3):
+            writer.write(i, "内容" * (i + 1), _table(i))
+    with open(writer.index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    assert index["compressed"] == compress
+    assert [r["table_idx"] for r in index["records"]] == [0, 1, 2]
+
+    opener = gzip.open if compress else open
+    with opener(os.path.join(str(tmp_path), index["path"]), "rb") as f:
+        data = f.read()
+    for record in index["records"]:
+        line = data[record["offset"]:record["offset"] + record["length"]]
+        assert line.endswith(b"\n")
+        assert json.loads(line)["table_idx"] == record["table_idx"]
+    last = index["records"][-1]
+    assert last["offset"] + last["length"] == len(data)
@@ -0,0 +1,104 @@
+from pdf_toolkit.stitch_function import stitch_tables
+from pdf_toolkit.table_grid import parse_table_html
+
+HEADER = "<tr><th>name</th><th>value</th></tr>"
+PAGE_HEIGHTS = [800.0, 800.0]
+
+
+def _table(rows, page_idx, bbox, header=True, caption=""):
+    body = "<table>" + (HEADER if header else "") + "".join(
+        "<tr>" + "".join(f"<td>{v}</td>" for v in row) + "</tr>" for row in rows
+    ) + "</table>"
+    return {"table_body": body, "table_caption": caption, "table_footnote": "",
+            "page_idx": page_idx, "bbox": list(bbox)}
+
+
+def _bottom(rows, **kwargs):
+    return _table(rows, 0, (50, 500, 550, 780), **kwargs)
+
+
+def _top(rows, **kwargs):
+    return _table(rows, 1, (50, 30, 550, 300), **kwargs)
+
+
+def test_continuation_is_merged_and_repeated_header_dropped():
+    groups = [
+        [_bottom([["a", "1"]]), _bottom([["a", "1"]])],
+        [_top([["b", "2"]]), _top([["b", "2"]])],
+    ]
+    stitched = stitch_tables(groups, PAGE_HEIGHTS)
+    assert len(stitched) == 1
+    merged = stitched[0][0]
+    assert parse_table_html(merged["table_body"]).texts() == [["name", "value"], ["a", "1"], ["b", "2"]]
+    assert merged["page_idx"] == 0
+    assert merged["stitched_parts"] == [
+        {"page_idx": 0, "bbox": [50, 500, 550, 780]},
+        {"page_idx": 1, "bbox": [50, 30, 550, 300]},
+    ]
+
+
+def test_continuation_without_header_keeps_all_rows():
+    groups = [[_bottom([["a", "1"]])], [_top([["b", "2"]], header=False)]]
+    stitched = stitch_tables(groups, PAGE_HEIGHTS)
+    assert len(stitched) == 1
+    assert parse_table_html(stitched[0][0]["table_body"]).texts() == [["name", "value"], ["a", "1"], ["b", "2"]]
+
+
+def test_column_count_mismatch_is_not_merged():
+    cur = _top([["b", "2", "extra"]], header=False)
+    stitched = stitch_tables([[_bottom([["a", "1"]])], [cur]], PAGE_HEIGHTS)
+    assert len(stitched) == 2
+
+
+def test_new_caption_without_repeated_header_is_not_merged():
+    cur = _top([["b", "2"]], header=False, caption="Table 2: another table")
+    stitched = stitch_tables([[_bottom([["a", "1"]])], [cur]], PAGE_HEIGHTS)
+    assert len(stitched) == 2
+
+
+def test_repeated_header_allows_caption():
+    cur = _top([["b", "2"]], caption="Table 1 (continued)")
+    stitched = stitch_tables([[_bottom([["a", "1"]])], [cur]], PAGE_HEIGHTS)
+    assert len(stitched) == 1
+
+
+def test_page_edge_check():
+    mid_page = _table([["a", "1"]], 0, (50, 200, 550, 400))
+    groups = [[mid_page], [_top([["b", "2"]])]]
+    assert len(stitch_tables(groups, PAGE_HEIGHTS)) == 2
+    # 不知道页面高度时不做位置判断
+    assert len(stitch_tables(groups)) == 1
+
+    low_on_next_page = _table([["b", "2"]], 1, (50, 500, 550, 700))
+    assert len(stitch_tables([[_bottom([["a", "1"]])], [low_on_next_page]], PAGE_HEIGHTS)) == 2
+
+
+def test_non_adjacent_pages_are_not_merged():
+    far = _table([["b", "2"]], 2, (50, 30, 550, 300))
+    assert len(stitch_tables([[_bottom([["a", "1"]])], [far]], PAGE_HEIGHTS + [800.0])) == 2
+
+
+def test_tool_that_saw_one_part_becomes_none():
+    groups = [
+        [_bottom([["a", "1"]]), _bottom([["a", "1"]]), _bottom([["a", "1"]])],
+        [_top([["b", "2"]]), _top([["b", "2"]]), None],
+    ]
+    stitched = stitch_tables(groups, PAGE_HEIGHTS)
+    assert len(stitched) == 1
+    assert stitched[0][0] is not None and stitched[0][1] is not None
+    assert stitched[0][2] is None
+
+
+def test_majority_of_tools_must_agree():
+    groups = [
+        [_bottom([["a", "1"]]), _bottom([["a", "1"]]), _bottom([["a", "1"]])],
+        [_top([["b", "2"]]), _top([["b", "2", "x"]], header=False), _top([["b", "2", "x"]], header=False)],
+    ]
+    assert len(stitch_tables(groups, PAGE_HEIGHTS)) == 2
+
+
+def test_inputs_are_not_mutated():
+    prev, cur = _bottom([["a", "1"]]), _top([["b", "2"]])
+    before = (dict(prev), dict(cur))
+    stitch_tables([[prev], [cur]], PAGE_HEIGHTS)
+    assert (prev, cur) == before
@@ -0,0 +1,87 @@
+import pytest
+from pdf_toolkit.table_grid import TableGrid, parse_table_html, grid_to_html, normalize_table_html
+from pdf_toolkit.table_metrics import teds, cell_f1
+
+SIMPLE = "<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table>"
+
+
+def test_rowspan_placement():
+    grid = parse_table_html("<table><tr><td rowspan=2>a</td><td>b</td></tr><tr><td>c</td></tr></table>")
+    assert grid.shape == (2, 2)
+    assert grid.texts() == [["a", "b"], ["a", "c"]]
+    assert grid.cell_at(1, 0) is grid.cell_at(0, 0)
+    assert grid.cell_at(1, 1).col == 1
+
+
+def test_colspan_placement_and_header_rows():
+    grid = parse_table_html('<table><tr><th colspan="2">h</th></tr><tr><td>1</td><td>2</td></tr></table>')
+    assert grid.shape == (2, 2)
+    assert grid.texts() == [["h", "h"], ["1", "2"]]
+    assert grid.header_row_count() == 1
+
+
+def test_rowspan_and_colspan_skip_occupied_slots():
+    grid = parse_table_html(
+        "<table><tr><td rowspan=2 colspan=2>a</td><td>b</td></tr>"
+        "<tr><td>c</td></tr><tr><td>d</td><td>e</td><td>f</td></tr></table>"
+    )
+    assert grid.shape == (3, 3)
+    assert grid.texts() == [["a", "a", "b"], ["a", "a", "c"], ["d", "e", "f"]]
+
+
+def test_trailing_rowspan_is_truncated():
+    grid = parse_table_html("<table><tr><td rowspan=5>a</td><td>b</td></tr><tr><td>c</td></tr></table>")
+    assert grid.shape == (2, 2)
+    assert grid.cell_at(0, 0).rowspan == 2
+    assert grid.to_html() == '<table><tr><td rowspan="2">a</td><td>b</td></tr><tr><td>c</td></tr></table>'
+
+
+def test_nested_table_is_cell_content():
+    grid = parse_table_html(
+        "<table><tr><td>x<table><tr><td>in</td></tr></table></td><td>y</td></tr></table>"
+        "<table><tr><td>second</td></tr></table>"
+    )
+    assert grid.shape == (1, 2)
+    assert "<table>" in grid.cell_at(0, 0).content
+    assert "in" in grid.text_at(0, 0)
+    assert grid.text_at(0, 1) == "y"
+
+
+@pytest.mark.parametrize("table_html", ["", "<table></table>", "no table here"])
+def test_empty_input_round_trip(table_html):
+    grid = parse_table_html(table_html)
+    assert grid.shape == (0, 0)
+    assert len(grid) == 0
+    assert grid_to_html(grid) == "<table></table>"
+
+
+def test_normalize_drops_attributes_and_sections():
+    messy = ('<table border="1"><thead><tr><th> a </th><th>b</th></tr></thead>'
+             '<tbody><tr><td>1</td><td>2</td></tr></tbody></table>')
+    assert normalize_table_html(messy) == SIMPLE
+    assert normalize_table_html(SIMPLE) == SIMPLE
+
+
+def test_from_texts_round_trip():
+    grid = TableGrid.from_texts([["a", "b"], ["1", "2"]], header_rows=1)
+    assert grid.to_html() == SIMPLE
+    assert parse_table_html(grid.to_html()).texts() == grid.texts()
+
+
+def test_teds():
+    changed = "<table><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>3</td></tr></table>"
+    assert teds(SIMPLE, SIMPLE) == 1.0
+    assert teds("", "") == 1.0
+    assert teds(SIMPLE, "") == 0.0
+    assert 0.0 < teds(SIMPLE, changed) < 1.0
+    assert teds(SIMPLE, changed, structure_only=True) == 1.0
+    assert teds(SIMPLE, "<table><tr><td>a</td></tr></table>", structure_only=True) < 1.0
+
+
+def test_cell_f1():
+    assert cell_f1(SIMPLE, SIMPLE)["f1"] == 1.0
+    assert cell_f1("", "") == {"precision": 1.0, "recall": 1.0, "f1": 1.0}
+    assert cell_f1(SIMPLE, "")["f1"] == 0.0
+    scores = cell_f1(SIMPLE, "<table><tr><td>A</td><td>x</td></tr></table>")
+    assert scores["precision"] == 0.25
+    assert scores["recall"] == 0.5